@@ -0,0 +1,78 @@
+# benchmarks/bench_fake_provider.py
+"""
+Prueba de carga del pipeline completo (run_batch) contra el proveedor simulado
+(src.fake_provider) en lugar de Yahoo: latencia, errores transitorios y throttling
+configurables y reproducibles (--seed), sin red. Muestra el tiempo total, las
+estadísticas de llamadas/reintentos/circuit breakers, el estado del limitador y lo
+que ha visto el "servidor". Los CSV y la cache se escriben en un directorio temporal.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.bench_fake_provider --tickers 50 --workers 8 --latency-ms 250 --error-rate 0.05
+"""
+
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+from src import disk_cache
+from src.fake_provider import FakeProvider, set_fake_provider
+from src.main import run_batch
+from src.rate_limiter import get_rate_limiter
+from src.utils import setup_logging
+from src.yahoo_client import get_call_stats, set_data_provider
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tickers', type=int, default=50)
+    parser.add_argument('--missing', type=int, default=2, help='Tickers sin datos (símbolos desconocidos) en el universo')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--latency-ms', type=float, default=250.0, help='Mediana de la latencia lognormal')
+    parser.add_argument('--sigma', type=float, default=0.6, help='Dispersión de la latencia lognormal (0 = fija)')
+    parser.add_argument('--error-rate', type=float, default=0.02, help='Fracción de peticiones con error transitorio')
+    parser.add_argument('--throttle-rps', type=float, default=8.0, help='Ritmo por encima del cual el servidor responde 429 (0 = sin límite)')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    setup_logging()
+    logging.getLogger().setLevel(logging.WARNING)
+    set_data_provider('fake')
+    provider = FakeProvider(
+        seed=args.seed,
+        latency={'distribution': 'lognormal', 'median_ms': args.latency_ms, 'sigma': args.sigma},
+        error_rate=args.error_rate,
+        throttle_rps=args.throttle_rps or None,
+    )
+    set_fake_provider(provider)
+    disk_cache.set_refresh(True)
+    tickers = [f"SYN{i:04d}" for i in range(args.tickers)] + [f"{provider.missing_prefix}{i:03d}" for i in range(args.missing)]
+
+    # Salidas, cache y cache negativa en un directorio temporal (las rutas de config.py son relativas)
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix='bench_fake_provider_')
+    os.chdir(workdir)
+    try:
+        start = time.perf_counter()
+        failed = run_batch(tickers, workers=args.workers)
+        elapsed = time.perf_counter() - start
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    stats = get_call_stats()
+    print(f"{len(tickers)} tickers ({args.missing} sin datos), {args.workers} workers, latencia mediana "
+          f"{args.latency_ms} ms (sigma {args.sigma}), errores {args.error_rate:.0%}, throttling > {args.throttle_rps} req/s")
+    print(f"  tiempo total       : {elapsed:8.2f} s ({elapsed / len(tickers) * 1000:.1f} ms/ticker)")
+    print(f"  tickers sin salida : {len(failed)}")
+    print(f"  llamadas           : {stats['calls']}")
+    print(f"  reintentos         : {stats['retries']}; fallos definitivos: {stats['failures']}")
+    print(f"  circuit breakers   : {stats['breaker_trips']}; rechazadas: {stats['rejected']}")
+    print(f"  limitador          : {get_rate_limiter().stats()}")
+    print(f"  servidor simulado  : {provider.stats()}")
+
+
+if __name__ == '__main__':
+    main()
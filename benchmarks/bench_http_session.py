@@ -0,0 +1,94 @@
+# benchmarks/bench_http_session.py
+"""
+Compara la latencia por ticker con una sesión HTTP nueva por ticker frente a la
+sesión compartida con keep-alive (src.yahoo_client.create_http_session), contra un
+servidor HTTP local. El coste de establecer cada conexión (TLS + cookie/crumb en
+Yahoo) se simula con --setup-ms.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.bench_http_session --tickers 100
+"""
+
+import argparse
+import json
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.yahoo_client import create_http_session
+
+# Peticiones que hace get_annual_fundamentals por ticker
+ENDPOINTS = ('financials', 'balance_sheet', 'income_stmt', 'info', 'history')
+
+
+def _make_handler(setup_seconds, latency_seconds):
+    class _Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive
+        # Cabeceras y cuerpo en un solo envío (evita la espera de ACK retardado de TCP)
+        wbufsize = 64 * 1024
+        disable_nagle_algorithm = True
+
+        def setup(self):
+            # Una vez por conexión TCP nueva
+            time.sleep(setup_seconds)
+            super().setup()
+
+        def do_GET(self):
+            time.sleep(latency_seconds)
+            body = json.dumps({'path': self.path}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+    return _Handler
+
+
+def _run_ticker(session, base_url, symbol):
+    start = time.perf_counter()
+    for endpoint in ENDPOINTS:
+        session.get(f"{base_url}/{endpoint}/{symbol}").raise_for_status()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tickers', type=int, default=100)
+    parser.add_argument('--setup-ms', type=float, default=30.0, help='Coste simulado de abrir una conexión')
+    parser.add_argument('--latency-ms', type=float, default=5.0, help='Latencia simulada por respuesta')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _make_handler(args.setup_ms / 1000, args.latency_ms / 1000))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    symbols = [f"T{i:03d}" for i in range(args.tickers)]
+
+    try:
+        # Sin compartir: una sesión (y por tanto conexiones nuevas) por ticker
+        per_ticker = []
+        for sym in symbols:
+            session = create_http_session()
+            per_ticker.append(_run_ticker(session, base_url, sym))
+            session.close()
+
+        # Sesión compartida por todo el proceso
+        shared_session = create_http_session()
+        shared = [_run_ticker(shared_session, base_url, sym) for sym in symbols]
+        shared_session.close()
+    finally:
+        server.shutdown()
+
+    mean_new = statistics.mean(per_ticker) * 1000
+    mean_shared = statistics.mean(shared) * 1000
+    print(f"{args.tickers} tickers x {len(ENDPOINTS)} peticiones (setup {args.setup_ms} ms, latencia {args.latency_ms} ms)")
+    print(f"  sesión por ticker : {mean_new:8.2f} ms/ticker  total {sum(per_ticker):6.2f} s")
+    print(f"  sesión compartida : {mean_shared:8.2f} ms/ticker  total {sum(shared):6.2f} s")
+    print(f"  ahorro            : {mean_new - mean_shared:8.2f} ms/ticker ({(1 - mean_shared / mean_new) * 100:.1f} %)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+# benchmarks/bench_statement_index.py
+"""
+Compara las búsquedas de métricas en los estados financieros con
+get_value_candidates_normalized (normaliza todo el índice en cada llamada) frente a
+src.statements.StatementIndex (etiquetas resueltas una vez, consultas O(1)), sobre
+estados sintéticos de --rows filas con las consultas que hace compute_fundamentals:
+todas las métricas de INCOME_LABELS / BALANCE_LABELS para cada columna de año.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.bench_statement_index --rows 150 --repeat 200
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.data_fetcher import get_value_candidates_normalized
+from src.statements import BALANCE_LABELS, INCOME_LABELS, StatementIndex
+
+
+def _statement(labels, n_rows, rng):
+    # Etiquetas reales de las métricas (algunas ausentes) más filas de relleno hasta n_rows
+    names = [candidates[0] for i, candidates in enumerate(labels.values()) if i % 3 != 2]
+    names += [f"Other Line Item {i}" for i in range(n_rows - len(names))]
+    cols = [pd.Timestamp(f"{year}-12-31") for year in (2024, 2023, 2022, 2021)]
+    return pd.DataFrame(rng.uniform(1e6, 1e10, (len(names), len(cols))), index=names, columns=cols)
+
+
+def _lookup_all_old(statements):
+    out = []
+    for df, labels in statements:
+        for date in df.columns:
+            for candidates in labels.values():
+                out.append(get_value_candidates_normalized(df, candidates, date))
+    return out
+
+
+def _lookup_all_indexed(statements):
+    out = []
+    for df, labels in statements:
+        index = StatementIndex(df, labels)
+        for date in index.columns:
+            for metric in labels:
+                out.append(index.get(metric, date))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=150, help='Filas por estado financiero')
+    parser.add_argument('--repeat', type=int, default=200, help='Tickers simulados')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    statements = [(_statement(INCOME_LABELS, args.rows, rng), INCOME_LABELS),
+                  (_statement(BALANCE_LABELS, args.rows, rng), BALANCE_LABELS)]
+    assert _lookup_all_old(statements) == _lookup_all_indexed(statements)
+
+    timings = {}
+    for name, fn in (('get_value_candidates_normalized', _lookup_all_old), ('StatementIndex', _lookup_all_indexed)):
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            fn(statements)
+        timings[name] = (time.perf_counter() - start) / args.repeat * 1000
+
+    lookups = sum(len(df.columns) * len(labels) for df, labels in statements)
+    old, new = timings['get_value_candidates_normalized'], timings['StatementIndex']
+    print(f"{args.rows} filas por estado, {lookups} consultas por ticker (media de {args.repeat} tickers)")
+    print(f"  get_value_candidates_normalized : {old:8.3f} ms/ticker")
+    print(f"  StatementIndex (incl. creación) : {new:8.3f} ms/ticker")
+    print(f"  aceleración                     : {old / new:8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,22 @@
 
 # Directorio de salida (sin cambios)
 OUTPUT_DIRECTORY = "output/"
+# Además del .xlsx, escribir los CSV raw y readable de cada ticker (--csv lo activa)
+WRITE_CSV = False
+# Con --tickers-file, un único .xlsx por ejecución (una hoja por ticker + 'summary') en
+# lugar de un .xlsx por ticker (--single-workbook lo activa)
+SINGLE_WORKBOOK = False
+# Directorio de los temporales por hoja del libro único (modo constant_memory de xlsxwriter;
+# None = el temporal del sistema)
+SINGLE_WORKBOOK_TMPDIR = None
+# Resultados que pueden esperar a la vez su turno en las salidas del lote que siguen el orden
+# del archivo; si se supera, el ticker que falta se añade a continuación cuando llegue
+BATCH_ORDER_MAX_PENDING = 200
+# Con --tickers-file, exportar además todo el lote como tabla larga (ticker, metric, period,
+# value, as_of) en Parquet particionado por fecha bajo PARQUET_DIRECTORY (--parquet lo activa)
+PARQUET_EXPORT = False
+PARQUET_DIRECTORY = "output/parquet/"
+PARQUET_ROW_GROUP_TICKERS = 500        # tickers por row group del archivo Parquet
 
 import datetime
 
@@ -42,3 +58,81 @@ CSV_ROW_NAMES = [
 # Años a extraer (desde 2021 hasta el año actual)
 START_YEAR = 2021
 YEARS_TO_EXTRACT = list(range(START_YEAR, datetime.datetime.now().year + 1))
+
+# Índice de referencia (benchmark) para el cálculo de beta. Se descarga una sola vez
+# por ejecución y se reutiliza durante BENCHMARK_CACHE_SECONDS entre tickers.
+BENCHMARK_TICKER = "^GSPC"
+BENCHMARK_CACHE_SECONDS = 6 * 60 * 60
+
+# Descarga agrupada de históricos: número de tickers por llamada a yf.download
+BATCH_HISTORY_CHUNK_SIZE = 100
+
+# Número máximo de descargas simultáneas (estados financieros, info, histórico...) del motor de fetch
+FETCH_ENGINE_WORKERS = 16
+
+# Limitador global de peticiones a Yahoo (token bucket + concurrencia adaptativa AIMD)
+RATE_LIMIT_REQUESTS_PER_SECOND = 5.0   # ritmo sostenido de peticiones
+RATE_LIMIT_BURST = 10                  # tokens acumulables para ráfagas
+RATE_LIMIT_INITIAL_CONCURRENCY = 4     # peticiones simultáneas al arrancar
+RATE_LIMIT_MIN_CONCURRENCY = 1
+RATE_LIMIT_MAX_CONCURRENCY = 16
+RATE_LIMIT_SLOW_SECONDS = 8.0          # una respuesta más lenta cuenta como señal de saturación
+RATE_LIMIT_DECREASE_FACTOR = 0.5       # reducción multiplicativa ante throttling/lentitud
+RATE_LIMIT_COOLDOWN_SECONDS = 5.0      # pausa global tras una respuesta de throttling
+
+# Reintentos por endpoint (backoff exponencial con jitter) y circuit breaker
+RETRY_MAX_ATTEMPTS = 4                 # intentos totales por llamada (1 = sin reintentos)
+RETRY_BASE_DELAY_SECONDS = 0.5
+RETRY_MAX_DELAY_SECONDS = 20.0
+CIRCUIT_BREAKER_FAILURE_THRESHOLD = 5  # fallos consecutivos que abren el circuito de un endpoint
+CIRCUIT_BREAKER_RESET_SECONDS = 60.0   # tiempo en abierto antes de permitir una llamada de prueba
+
+# Sesión HTTP compartida (keep-alive) para todos los yf.Ticker del proceso
+HTTP_POOL_SIZE = 32                    # conexiones reutilizables por hilo
+HTTP_TIMEOUT_SECONDS = 30
+HTTP_IMPERSONATE = "chrome"            # huella de navegador de curl_cffi que acepta Yahoo
+
+# Pipeline por etapas (descarga -> cálculo -> escritura) para --tickers-file con --workers > 1
+PIPELINE_COMPUTE_WORKERS = 2
+PIPELINE_WRITER_WORKERS = 2
+PIPELINE_QUEUE_SIZE = 16               # tickers en espera entre etapas (backpressure)
+
+# Cache en disco de los datasets descargados de Yahoo (Parquet por (ticker, dataset))
+CACHE_ENABLED = True
+CACHE_DIRECTORY = ".cache/yfinance/"
+# Validez por dataset en segundos; "eod" = válido hasta el final del día en que se descargó
+CACHE_TTL_SECONDS = {
+    'financials': 7 * 24 * 60 * 60,
+    'balance_sheet': 7 * 24 * 60 * 60,
+    'earnings': 7 * 24 * 60 * 60,
+    'info': 15 * 60,
+    'history': "eod",
+}
+
+# Actualización incremental del histórico diario guardado: se piden solo las barras
+# desde la última guardada menos este solape (revisiones, dividendos/splits tardíos)
+HISTORY_OVERLAP_DAYS = 7
+
+# Cache negativa de tickers inválidos, deslistados o sin datos (en CACHE_DIRECTORY)
+NEGATIVE_CACHE_ENABLED = True
+# Tiempo hasta volver a comprobar un ticker según el tipo de fallo; se duplica en cada
+# comprobación fallida hasta NEGATIVE_CACHE_MAX_SECONDS
+NEGATIVE_CACHE_TTL_SECONDS = {
+    'missing': 7 * 24 * 60 * 60,       # Yahoo no conoce el símbolo / posiblemente deslistado
+    'empty': 24 * 60 * 60,             # sin estados financieros ni histórico
+}
+NEGATIVE_CACHE_MAX_SECONDS = 90 * 24 * 60 * 60
+
+# Origen de los datos: "yahoo" (red) o "fake" (proveedor sintético en proceso, ver
+# src/fake_provider.py) para pruebas de carga y latencia reproducibles sin red
+DATA_PROVIDER = "yahoo"
+FAKE_PROVIDER_SEED = 42
+# Latencia por petición: {'distribution': 'fixed' | 'uniform' | 'lognormal', ...} en milisegundos
+FAKE_PROVIDER_LATENCY = {'distribution': 'lognormal', 'median_ms': 250, 'sigma': 0.6}
+FAKE_PROVIDER_ERROR_RATE = 0.02        # fracción de peticiones con error transitorio de red
+FAKE_PROVIDER_THROTTLE_RPS = 8.0       # por encima de este ritmo responde con throttling (None = sin límite)
+FAKE_PROVIDER_THROTTLE_BURST = 16
+FAKE_PROVIDER_MISSING_PREFIX = "ZZ"    # símbolos que el proveedor no conoce (sin datos)
+
+# Ventana (en días de mercado) de la beta móvil de src/beta.py (252 ≈ un año bursátil)
+BETA_ROLLING_WINDOW = 252
@@ -0,0 +1,179 @@
+# src/beta.py
+
+import threading
+
+import numpy as np
+import pandas as pd
+from config import BETA_ROLLING_WINDOW
+from src.price_summary import PriceHistorySummary
+
+# Betas anuales calculadas para todo el lote (run_batch): {símbolo: (histórico, benchmark, {año: beta})}.
+# Solo se reutilizan si compute_fundamentals recibe exactamente esos mismos históricos.
+_batch_lock = threading.Lock()
+_batch_betas = {}
+# Rendimientos del benchmark (compartido por todos los tickers), calculados una vez por histórico
+_market_lock = threading.Lock()
+_market_returns = (None, None)
+
+
+def market_returns(market_hist) -> pd.Series:
+    """Rendimientos diarios por año del benchmark (memorizados mientras no cambie el histórico)."""
+    global _market_returns
+    with _market_lock:
+        hist, returns = _market_returns
+        if hist is not market_hist:
+            returns = PriceHistorySummary(market_hist).returns
+            _market_returns = (market_hist, returns)
+        return returns
+
+
+def _aligned_returns(stock_returns: pd.DataFrame, market: pd.Series):
+    """
+    (fechas, rendimientos fecha × ticker, rendimientos del mercado) como arrays sobre la
+    unión de fechas de ambos, o None si no hay datos o los índices no son comparables.
+    """
+    if stock_returns.empty or market is None or market.empty:
+        return None
+    dates = stock_returns.index.union(market.index)
+    if not isinstance(dates, pd.DatetimeIndex):
+        # Índices no comparables (p. ej. uno con zona horaria y otro sin ella)
+        return None
+    return dates, stock_returns.reindex(dates).to_numpy(dtype=float), market.reindex(dates).to_numpy(dtype=float)
+
+
+def batch_annual_betas(stock_returns: pd.DataFrame, market: pd.Series, years) -> pd.DataFrame:
+    """
+    Beta de cada año (filas) para cada columna de `stock_returns` (rendimientos diarios por
+    ticker) frente a `market`, con operaciones matriciales: se alinea todo una vez y la
+    covarianza y la varianza de todos los años y tickers salen de sumas por bloques de año.
+    Solo cuentan los días con rendimiento de ambos (como un inner join por ticker).
+    Resultado: None si no hay días comunes o la varianza del mercado es 0; NaN con un solo día.
+    """
+    years = list(years)
+    out = pd.DataFrame(None, index=years, columns=stock_returns.columns, dtype=object)
+    aligned = _aligned_returns(stock_returns, market)
+    if aligned is None:
+        return out
+    dates, y, x = aligned
+    date_years = dates.year.to_numpy()
+    keep = np.isin(date_years, years)
+    y, x, date_years = y[keep], x[keep], date_years[keep]
+    if not len(date_years):
+        return out
+
+    # Bloques contiguos por año (las fechas están ordenadas)
+    starts = np.flatnonzero(np.r_[True, date_years[1:] != date_years[:-1]])
+    block_years = date_years[starts]
+    block_of_row = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(date_years)]))
+
+    valid = ~np.isnan(y) & ~np.isnan(x)[:, None]
+    xv = np.where(valid, x[:, None], 0.0)
+    yv = np.where(valid, y, 0.0)
+    n = np.add.reduceat(valid, starts, axis=0).astype(float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_x = np.add.reduceat(xv, starts, axis=0) / n
+        mean_y = np.add.reduceat(yv, starts, axis=0) / n
+        dx = np.where(valid, x[:, None] - mean_x[block_of_row], 0.0)
+        dy = np.where(valid, y - mean_y[block_of_row], 0.0)
+        var_x = np.add.reduceat(dx * dx, starts, axis=0) / (n - 1)
+        cov_xy = np.add.reduceat(dx * dy, starts, axis=0) / (n - 1)
+        beta = cov_xy / var_x
+
+    for i, year in enumerate(block_years):
+        for j, col in enumerate(stock_returns.columns):
+            if n[i, j] == 0 or var_x[i, j] == 0:
+                continue
+            out.at[year, col] = float(beta[i, j])
+    return out
+
+
+def annual_betas(stock_returns: pd.Series, market: pd.Series, years) -> dict:
+    """{año: beta} de un ticker (ver batch_annual_betas)."""
+    table = batch_annual_betas(stock_returns.to_frame('stock'), market, years)
+    return table['stock'].to_dict()
+
+
+def rolling_beta(stock_returns: pd.Series, market: pd.Series, window: int = BETA_ROLLING_WINDOW) -> pd.Series:
+    """
+    Beta móvil de `window` días con rendimiento de ambos (p. ej. 252, un año bursátil),
+    indexada por fecha. Los rendimientos se alinean una vez (como en batch_annual_betas) y
+    todas las ventanas salen de sumas acumuladas, así que el coste no depende de `window`.
+    Los primeros window - 1 días quedan sin valor (NaN), igual que si la varianza es 0.
+    """
+    aligned = _aligned_returns(stock_returns.to_frame('stock'), market)
+    if aligned is None:
+        return pd.Series(dtype=float)
+    dates, y, x = aligned
+    y = y[:, 0]
+    valid = ~np.isnan(y) & ~np.isnan(x)
+    dates, y, x = dates[valid], y[valid], x[valid]
+    beta = np.full(len(x), np.nan)
+    if 2 <= window <= len(x):
+        # Centrar antes de acumular evita perder precisión al restar sumas grandes
+        x, y = x - x.mean(), y - y.mean()
+
+        def window_sum(values):
+            total = np.concatenate([[0.0], np.cumsum(values)])
+            return total[window:] - total[:-window]
+
+        sum_x, sum_y = window_sum(x), window_sum(y)
+        var_x = window_sum(x * x) - sum_x * sum_x / window
+        cov_xy = window_sum(x * y) - sum_x * sum_y / window
+        with np.errstate(invalid='ignore', divide='ignore'):
+            beta[window - 1:] = cov_xy / np.where(var_x > 0, var_x, np.nan)
+    return pd.Series(beta, index=dates, name='beta')
+
+
+def precompute_batch_betas(price_hists: dict, market_hist, years):
+    """
+    Calcula en una sola operación matricial las betas anuales de todos los tickers del lote
+    frente al benchmark y las deja disponibles para compute_fundamentals (ver get_batch_betas).
+    """
+    market = market_returns(market_hist)
+    returns = {sym: PriceHistorySummary(hist).returns for sym, hist in price_hists.items()}
+    table = batch_annual_betas(pd.DataFrame(returns), market, years) if returns else pd.DataFrame()
+    with _batch_lock:
+        _batch_betas.clear()
+        for sym, hist in price_hists.items():
+            _batch_betas[sym.upper()] = (hist, market_hist, table[sym].to_dict())
+
+
+def get_batch_betas(symbol: str, price_hist, market_hist):
+    """Betas anuales precalculadas del lote para estos mismos históricos, o None."""
+    with _batch_lock:
+        entry = _batch_betas.get(symbol.upper())
+    if entry is None or entry[0] is not price_hist or entry[1] is not market_hist:
+        return None
+    return entry[2]
+
+
+def panel_annual_betas(prices: dict, benchmarks, n_tickers, years) -> np.ndarray:
+    """
+    Betas anuales (ticker × año, NaN = sin beta) de todos los tickers de un panel de precios
+    (ver price_panel) frente a su benchmark, con una operación matricial por benchmark distinto.
+    """
+    betas = np.full((n_tickers, len(years)), np.nan)
+    code, dates, returns = prices['returns']
+    groups = {}
+    for t, bench in enumerate(benchmarks):
+        if isinstance(bench, pd.DataFrame):
+            groups.setdefault(id(bench), (bench, []))[1].append(t)
+    for bench, members in groups.values():
+        market = market_returns(bench)
+        mask = np.isin(code, members)
+        try:
+            stock = pd.Series(returns[mask], index=pd.MultiIndex.from_arrays([dates[mask], code[mask]])).unstack()
+            tables = [batch_annual_betas(stock, market, years)]
+        except ValueError:
+            # Fechas repetidas en algún histórico: ese ticker se queda sin beta, no todo el lote
+            tables = []
+            for t in members:
+                rows = code == t
+                try:
+                    tables.append(batch_annual_betas(pd.Series(returns[rows], index=dates[rows]).to_frame(t), market, years))
+                except ValueError:
+                    continue
+        for table in tables:
+            cols = table.columns.to_numpy(dtype=int)
+            betas[cols] = table.astype(float).to_numpy().T
+    return betas
@@ -0,0 +1,173 @@
+# src/disk_cache.py
+
+import json
+import logging
+import os
+import re
+import threading
+from collections import Counter
+from datetime import datetime
+
+import pandas as pd
+from config import CACHE_ENABLED, CACHE_DIRECTORY, CACHE_TTL_SECONDS
+
+_stats_lock = threading.Lock()
+_stats = {'hits': Counter(), 'misses': Counter(), 'stale': Counter(), 'writes': Counter()}
+# --refresh: ignora lo guardado (pero sigue escribiendo lo que se descarga)
+_refresh = False
+
+
+def set_refresh(refresh: bool):
+    """Activa/desactiva el modo --refresh (no leer de la cache)."""
+    global _refresh
+    _refresh = bool(refresh)
+
+
+def is_refresh() -> bool:
+    """Indica si la ejecución usa --refresh."""
+    return _refresh
+
+
+def _entry_paths(symbol: str, dataset: str, directory: str = CACHE_DIRECTORY):
+    safe_symbol = re.sub(r'[^A-Za-z0-9._^=-]', '_', symbol.upper())
+    base = os.path.join(directory, safe_symbol, dataset)
+    return base + '.json', base + '.parquet'
+
+
+def _is_fresh(dataset: str, fetched_at: datetime) -> bool:
+    ttl = CACHE_TTL_SECONDS.get(dataset, 0)
+    now = datetime.now()
+    if ttl == 'eod':
+        return fetched_at.date() == now.date()
+    return (now - fetched_at).total_seconds() < ttl
+
+
+def _count(kind, dataset):
+    with _stats_lock:
+        _stats[kind][dataset] += 1
+
+
+def get_cache_stats() -> dict:
+    """Aciertos, fallos, entradas caducadas y escrituras de la cache por dataset."""
+    with _stats_lock:
+        return {kind: dict(counter) for kind, counter in _stats.items()}
+
+
+def _read_meta(symbol: str, dataset: str, directory: str = CACHE_DIRECTORY):
+    """Lee el .json de la entrada; None si no existe o está corrupta."""
+    meta_path, _ = _entry_paths(symbol, dataset, directory)
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logging.warning(f"Entrada de cache ilegible para {symbol}/{dataset}: {e}")
+        return None
+
+
+def _read_value(symbol: str, dataset: str, meta: dict, directory: str = CACHE_DIRECTORY):
+    """Lee el valor de una entrada a partir de su .json (lanza si el Parquet no se puede leer)."""
+    kind = meta['kind']
+    if kind == 'none':
+        return None
+    if kind == 'json':
+        return meta['value']
+    _, data_path = _entry_paths(symbol, dataset, directory)
+    value = pd.read_parquet(data_path)
+    # Los estados financieros se guardan traspuestos (Parquet exige columnas de texto)
+    return value.T if kind == 'frame_T' else value
+
+
+def load(symbol: str, dataset: str):
+    """
+    Busca (symbol, dataset) en la cache. Devuelve (True, valor) si hay una entrada vigente
+    según CACHE_TTL_SECONDS y (False, None) en caso contrario.
+    """
+    if not CACHE_ENABLED or _refresh:
+        return False, None
+    meta = _read_meta(symbol, dataset)
+    if meta is None:
+        _count('misses', dataset)
+        return False, None
+    if not _is_fresh(dataset, datetime.fromisoformat(meta['fetched_at'])):
+        _count('stale', dataset)
+        return False, None
+    try:
+        value = _read_value(symbol, dataset, meta)
+    except Exception as e:
+        logging.warning(f"No se pudo leer la cache de {symbol}/{dataset}: {e}")
+        _count('misses', dataset)
+        return False, None
+    _count('hits', dataset)
+    return True, value
+
+
+def load_stale(symbol: str, dataset: str):
+    """
+    Devuelve lo guardado para (symbol, dataset) aunque haya caducado (p. ej. para
+    ampliarlo de forma incremental), o None si no hay entrada o se usa --refresh.
+    """
+    if not CACHE_ENABLED or _refresh:
+        return None
+    meta = _read_meta(symbol, dataset)
+    if meta is None:
+        return None
+    try:
+        return _read_value(symbol, dataset, meta)
+    except Exception as e:
+        logging.warning(f"No se pudo leer la cache de {symbol}/{dataset}: {e}")
+        return None
+
+
+def _atomic_write(path, write_fn):
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    write_fn(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def read_entry(directory: str, symbol: str, dataset: str):
+    """
+    Lee una entrada (symbol, dataset) guardada con write_entry bajo `directory`, sin
+    comprobar su validez. Devuelve (True, valor) o (False, None) si no existe.
+    """
+    meta = _read_meta(symbol, dataset, directory)
+    if meta is None:
+        return False, None
+    return True, _read_value(symbol, dataset, meta, directory)
+
+
+def write_entry(directory: str, symbol: str, dataset: str, value):
+    """Escribe una entrada bajo `directory`: los DataFrames van en Parquet y los dict en JSON."""
+    meta_path, data_path = _entry_paths(symbol, dataset, directory)
+    meta = {'fetched_at': datetime.now().isoformat()}
+    os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+    if value is None:
+        meta['kind'] = 'none'
+    elif isinstance(value, pd.DataFrame):
+        if all(isinstance(c, str) for c in value.columns):
+            meta['kind'], frame = 'frame', value
+        else:
+            meta['kind'], frame = 'frame_T', value.T
+            frame.columns = [str(c) for c in frame.columns]
+        _atomic_write(data_path, frame.to_parquet)
+    else:
+        meta['kind'], meta['value'] = 'json', value
+    # El .json se escribe al final: marca la entrada como completa
+    _atomic_write(meta_path, lambda p: _write_json(p, meta))
+
+
+def store(symbol: str, dataset: str, value):
+    """Guarda un dataset descargado. Los DataFrames van en Parquet y los dict en JSON."""
+    if not CACHE_ENABLED:
+        return
+    try:
+        write_entry(CACHE_DIRECTORY, symbol, dataset, value)
+        _count('writes', dataset)
+    except Exception as e:
+        logging.warning(f"No se pudo guardar en cache {symbol}/{dataset}: {e}")
+
+
+def _write_json(path, data):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, default=str)
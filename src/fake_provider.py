@@ -0,0 +1,330 @@
+# src/fake_provider.py
+"""
+Proveedor de datos sintético en proceso que sustituye a Yahoo (DATA_PROVIDER = "fake").
+Imita la interfaz de yf.Ticker (financials, income_stmt, balance_sheet, info, history)
+y de yf.download, con datos deterministas por símbolo, y simula la latencia, los
+errores transitorios y el throttling del servicio real según FAKE_PROVIDER_*.
+"""
+
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+from yfinance.exceptions import YFRateLimitError
+from config import (
+    FAKE_PROVIDER_SEED, FAKE_PROVIDER_LATENCY, FAKE_PROVIDER_ERROR_RATE,
+    FAKE_PROVIDER_THROTTLE_RPS, FAKE_PROVIDER_THROTTLE_BURST, FAKE_PROVIDER_MISSING_PREFIX,
+)
+
+# Los precios se generan desde este origen fijo y se recortan a la ventana pedida, de modo
+# que dos peticiones que se solapan devuelven las mismas barras (como Yahoo)
+_HISTORY_ORIGIN = pd.Timestamp('2015-01-01')
+_MARKET_TZ = 'America/New_York'
+
+INCOME_ROWS = [
+    'Total Revenue', 'Operating Revenue', 'Cost Of Revenue', 'Gross Profit', 'Operating Expense',
+    'Selling General And Administration', 'Research And Development', 'Operating Income',
+    'Interest Expense', 'Pretax Income', 'Tax Provision', 'Net Income',
+    'Net Income Common Stockholders', 'EBIT', 'EBITDA', 'Normalized EBITDA',
+    'Reconciled Depreciation', 'Basic EPS', 'Diluted EPS', 'Basic Average Shares',
+    'Diluted Average Shares',
+]
+BALANCE_ROWS = [
+    'Total Assets', 'Current Assets', 'Cash And Cash Equivalents', 'Receivables', 'Inventory',
+    'Total Non Current Assets', 'Net PPE', 'Goodwill', 'Goodwill And Other Intangible Assets',
+    'Total Liabilities Net Minority Interest', 'Current Liabilities', 'Long Term Debt',
+    'Current Debt', 'Total Debt', 'Net Debt', 'Stockholders Equity', 'Working Capital',
+    'Invested Capital', 'Tangible Book Value', 'Net Tangible Assets', 'Ordinary Shares Number',
+    'Share Issued',
+]
+
+
+class FakeProvider:
+    """
+    Estado compartido del servicio simulado: generador de latencias y errores, token bucket
+    del lado del "servidor" (por encima de `throttle_rps` responde con YFRateLimitError) y
+    contadores de peticiones.
+    """
+
+    def __init__(self, seed=FAKE_PROVIDER_SEED, latency=FAKE_PROVIDER_LATENCY, error_rate=FAKE_PROVIDER_ERROR_RATE,
+                 throttle_rps=FAKE_PROVIDER_THROTTLE_RPS, throttle_burst=FAKE_PROVIDER_THROTTLE_BURST,
+                 missing_prefix=FAKE_PROVIDER_MISSING_PREFIX):
+        self.latency = dict(latency)
+        self.error_rate = float(error_rate)
+        self.throttle_rps = throttle_rps
+        self.throttle_burst = float(throttle_burst)
+        self.missing_prefix = missing_prefix
+        self._lock = threading.Lock()
+        self._rng = np.random.default_rng(seed)
+        self._tokens = self.throttle_burst
+        self._last_refill = time.monotonic()
+        self._stats = Counter()
+
+    def _sample_latency(self) -> float:
+        kind = self.latency.get('distribution', 'fixed')
+        with self._lock:
+            if kind == 'uniform':
+                ms = self._rng.uniform(self.latency.get('min_ms', 0), self.latency.get('max_ms', 0))
+            elif kind == 'lognormal':
+                ms = self.latency.get('median_ms', 0) * self._rng.lognormal(0.0, self.latency.get('sigma', 0.5))
+            else:
+                ms = self.latency.get('ms', self.latency.get('median_ms', 0))
+        return ms / 1000.0
+
+    def _admit(self) -> bool:
+        """Token bucket del servidor: False si la petición supera el ritmo permitido."""
+        if self.throttle_rps is None:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.throttle_burst, self._tokens + (now - self._last_refill) * self.throttle_rps)
+            self._last_refill = now
+            if self._tokens < 1.0:
+                return False
+            self._tokens -= 1.0
+            return True
+
+    def request(self, endpoint: str):
+        """Simula una petición al endpoint: espera la latencia y lanza los errores configurados."""
+        with self._lock:
+            self._stats['requests'] += 1
+            failed = self._rng.random() < self.error_rate
+        if not self._admit():
+            # Las respuestas 429 llegan rápido
+            time.sleep(self._sample_latency() * 0.1)
+            with self._lock:
+                self._stats['throttled'] += 1
+            raise YFRateLimitError()
+        time.sleep(self._sample_latency())
+        if failed:
+            with self._lock:
+                self._stats['errors'] += 1
+            raise ConnectionError(f"Error de red simulado en '{endpoint}'")
+
+    def is_missing(self, symbol: str) -> bool:
+        return bool(self.missing_prefix) and symbol.upper().startswith(self.missing_prefix)
+
+    def stats(self) -> dict:
+        """Peticiones recibidas, respondidas con throttling y con error transitorio."""
+        with self._lock:
+            return dict(self._stats)
+
+
+_provider_lock = threading.Lock()
+_provider = None
+
+
+def get_fake_provider() -> FakeProvider:
+    """Devuelve el proveedor simulado del proceso (se crea con FAKE_PROVIDER_* en la primera llamada)."""
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            _provider = FakeProvider()
+        return _provider
+
+
+def set_fake_provider(provider: FakeProvider):
+    """Sustituye el proveedor simulado (p. ej. con otra latencia o tasa de errores en un benchmark)."""
+    global _provider
+    with _provider_lock:
+        _provider = provider
+
+
+def _symbol_rng(symbol: str, salt: str):
+    return np.random.default_rng(zlib.crc32(f"{symbol.upper()}/{salt}".encode()))
+
+
+def _fiscal_year_ends(n=4):
+    last = pd.Timestamp.now().year - 1
+    return [pd.Timestamp(f"{year}-12-31") for year in range(last, last - n, -1)]
+
+
+def _income_statement(symbol: str) -> pd.DataFrame:
+    rng = _symbol_rng(symbol, 'income')
+    cols = _fiscal_year_ends()
+    revenue = rng.uniform(1e9, 1e11) * np.cumprod(rng.normal(1.0, 0.08, len(cols)))
+    cost = revenue * rng.uniform(0.4, 0.7)
+    opex = revenue * rng.uniform(0.1, 0.25)
+    op_income = revenue - cost - opex
+    interest = revenue * rng.uniform(0.0, 0.02)
+    pretax = op_income - interest
+    tax = np.maximum(pretax, 0) * 0.21
+    net = pretax - tax
+    da = revenue * rng.uniform(0.02, 0.06)
+    shares = rng.uniform(1e8, 5e9) * np.cumprod(np.full(len(cols), 1.01))
+    values = {
+        'Total Revenue': revenue, 'Operating Revenue': revenue, 'Cost Of Revenue': cost,
+        'Gross Profit': revenue - cost, 'Operating Expense': opex,
+        'Selling General And Administration': opex * 0.7, 'Research And Development': opex * 0.3,
+        'Operating Income': op_income, 'Interest Expense': interest, 'Pretax Income': pretax,
+        'Tax Provision': tax, 'Net Income': net, 'Net Income Common Stockholders': net,
+        'EBIT': pretax + interest, 'EBITDA': pretax + interest + da, 'Normalized EBITDA': pretax + interest + da,
+        'Reconciled Depreciation': da, 'Basic EPS': net / shares, 'Diluted EPS': net / (shares * 1.02),
+        'Basic Average Shares': shares, 'Diluted Average Shares': shares * 1.02,
+    }
+    return pd.DataFrame([values[row] for row in INCOME_ROWS], index=INCOME_ROWS, columns=cols)
+
+
+def _balance_sheet(symbol: str) -> pd.DataFrame:
+    rng = _symbol_rng(symbol, 'balance')
+    cols = _fiscal_year_ends()
+    assets = rng.uniform(2e9, 2e11) * np.cumprod(rng.normal(1.0, 0.05, len(cols)))
+    current = assets * rng.uniform(0.2, 0.4)
+    cash = current * rng.uniform(0.2, 0.5)
+    goodwill = assets * rng.uniform(0.0, 0.15)
+    liabilities = assets * rng.uniform(0.4, 0.8)
+    current_liab = liabilities * rng.uniform(0.3, 0.5)
+    lt_debt = liabilities * rng.uniform(0.2, 0.5)
+    st_debt = liabilities * rng.uniform(0.0, 0.1)
+    equity = assets - liabilities
+    shares = np.full(len(cols), rng.uniform(1e8, 5e9))
+    values = {
+        'Total Assets': assets, 'Current Assets': current, 'Cash And Cash Equivalents': cash,
+        'Receivables': current * 0.3, 'Inventory': current * 0.2, 'Total Non Current Assets': assets - current,
+        'Net PPE': (assets - current) * 0.5, 'Goodwill': goodwill, 'Goodwill And Other Intangible Assets': goodwill * 1.4,
+        'Total Liabilities Net Minority Interest': liabilities, 'Current Liabilities': current_liab,
+        'Long Term Debt': lt_debt, 'Current Debt': st_debt, 'Total Debt': lt_debt + st_debt,
+        'Net Debt': lt_debt + st_debt - cash, 'Stockholders Equity': equity,
+        'Working Capital': current - current_liab, 'Invested Capital': equity + lt_debt + st_debt,
+        'Tangible Book Value': equity - goodwill * 1.4, 'Net Tangible Assets': equity - goodwill * 1.4,
+        'Ordinary Shares Number': shares, 'Share Issued': shares,
+    }
+    return pd.DataFrame([values[row] for row in BALANCE_ROWS], index=BALANCE_ROWS, columns=cols)
+
+
+def _full_history(symbol: str) -> pd.DataFrame:
+    """Barras diarias deterministas del símbolo desde _HISTORY_ORIGIN hasta hoy (con acciones)."""
+    rng = _symbol_rng(symbol, 'history')
+    idx = pd.bdate_range(_HISTORY_ORIGIN, pd.Timestamp.now().normalize(), tz=_MARKET_TZ)
+    close = rng.uniform(10, 500) * np.cumprod(1 + rng.normal(0.0003, rng.uniform(0.01, 0.03), len(idx)))
+    spread = np.abs(rng.normal(0, 0.01, len(idx)))
+    df = pd.DataFrame({
+        'Open': close * (1 + rng.normal(0, 0.005, len(idx))),
+        'High': close * (1 + spread),
+        'Low': close * (1 - spread),
+        'Close': close,
+        'Volume': rng.integers(1e5, 5e7, len(idx)).astype(float),
+        'Dividends': 0.0,
+        'Stock Splits': 0.0,
+    }, index=idx)
+    df.index.name = 'Date'
+    if rng.random() < 0.7:
+        # Dividendo trimestral (primer día hábil de cada trimestre)
+        quarterly = df.index[~pd.Series(idx.tz_localize(None).to_period('Q')).duplicated().to_numpy()]
+        df.loc[quarterly, 'Dividends'] = round(close.mean() * rng.uniform(0.002, 0.01), 2)
+    if rng.random() < 0.1:
+        df.iloc[int(rng.integers(len(idx))), df.columns.get_loc('Stock Splits')] = 2.0
+    return df
+
+
+def _history_window(start=None, end=None, period=None):
+    end_ts = pd.Timestamp(end) if end is not None else pd.Timestamp.now().normalize() + pd.Timedelta(days=1)
+    if start is not None:
+        return pd.Timestamp(start), end_ts
+    match = re.fullmatch(r'(\d+)(d|wk|mo|y)', period or '1mo')
+    if match is None:
+        return _HISTORY_ORIGIN, end_ts
+    n, unit = int(match.group(1)), match.group(2)
+    offset = {'d': pd.Timedelta(days=n), 'wk': pd.Timedelta(weeks=n),
+              'mo': pd.DateOffset(months=n), 'y': pd.DateOffset(years=n)}[unit]
+    return end_ts - offset, end_ts
+
+
+def _history(symbol, start=None, end=None, period=None, actions=True) -> pd.DataFrame:
+    full = _full_history(symbol)
+    start_ts, end_ts = _history_window(start, end, period)
+    naive = full.index.tz_localize(None)
+    df = full[(naive >= start_ts) & (naive < end_ts)]
+    return df if actions else df.drop(columns=['Dividends', 'Stock Splits'])
+
+
+def _info(symbol: str) -> dict:
+    rng = _symbol_rng(symbol, 'info')
+    income = _income_statement(symbol)
+    hist = _full_history(symbol)
+    last_year = hist['Close'].iloc[-252:]
+    price = float(hist['Close'].iloc[-1])
+    shares = float(_balance_sheet(symbol).loc['Ordinary Shares Number'].iloc[0])
+    eps = float(income.loc['Diluted EPS'].iloc[0])
+    dividend_rate = float(hist['Dividends'].iloc[-252:].sum())
+    return {
+        'symbol': symbol.upper(),
+        'shortName': f"{symbol.upper()} Synthetic Corp",
+        'currency': 'USD',
+        'regularMarketPrice': price,
+        'currentPrice': price,
+        'sharesOutstanding': shares,
+        'marketCap': price * shares,
+        'beta': round(float(rng.uniform(0.5, 1.8)), 3),
+        'trailingEps': eps,
+        'forwardEps': eps * float(rng.uniform(0.9, 1.2)),
+        'trailingPE': price / eps if eps > 0 else None,
+        'forwardPE': price / (eps * 1.1) if eps > 0 else None,
+        'dividendRate': dividend_rate or None,
+        'dividendYield': dividend_rate / price if dividend_rate else None,
+        'payoutRatio': dividend_rate / eps if dividend_rate and eps > 0 else 0.0,
+        'fiftyTwoWeekLow': float(last_year.min()),
+        'fiftyTwoWeekHigh': float(last_year.max()),
+        'totalRevenue': float(income.loc['Total Revenue'].iloc[0]),
+        'netIncomeToCommon': float(income.loc['Net Income'].iloc[0]),
+        'EBITDA': float(income.loc['EBITDA'].iloc[0]),
+        'profitMargins': float(income.loc['Net Income'].iloc[0] / income.loc['Total Revenue'].iloc[0]),
+        'operatingMargins': float(income.loc['Operating Income'].iloc[0] / income.loc['Total Revenue'].iloc[0]),
+        'returnOnEquity': float(rng.uniform(-0.1, 0.4)),
+    }
+
+
+class FakeTicker:
+    """Sustituto de yf.Ticker respaldado por el proveedor simulado."""
+
+    def __init__(self, symbol: str, session=None, provider: FakeProvider = None):
+        self.ticker = symbol.upper()
+        self._provider = provider or get_fake_provider()
+
+    def _statement(self, endpoint, build):
+        self._provider.request(endpoint)
+        return pd.DataFrame() if self._provider.is_missing(self.ticker) else build(self.ticker)
+
+    @property
+    def financials(self) -> pd.DataFrame:
+        return self._statement('financials', _income_statement)
+
+    @property
+    def income_stmt(self) -> pd.DataFrame:
+        return self._statement('income_stmt', _income_statement)
+
+    @property
+    def balance_sheet(self) -> pd.DataFrame:
+        return self._statement('balance_sheet', _balance_sheet)
+
+    @property
+    def info(self) -> dict:
+        self._provider.request('info')
+        # Yahoo responde a símbolos desconocidos con un dict casi vacío
+        return {'trailingPegRatio': None} if self._provider.is_missing(self.ticker) else _info(self.ticker)
+
+    def history(self, period=None, interval='1d', start=None, end=None, actions=True, **kwargs) -> pd.DataFrame:
+        self._provider.request('history')
+        if self._provider.is_missing(self.ticker):
+            return pd.DataFrame()
+        return _history(self.ticker, start=start, end=end, period=period, actions=actions)
+
+
+def download(tickers, start=None, end=None, period=None, actions=False, group_by='column', **kwargs) -> pd.DataFrame:
+    """
+    Sustituto de yf.download(group_by='ticker'): una petición simulada por llamada y un
+    DataFrame con columnas (símbolo, campo) e índice sin zona horaria.
+    """
+    provider = get_fake_provider()
+    provider.request('download')
+    symbols = [tickers] if isinstance(tickers, str) else list(tickers)
+    frames = {sym: _history(sym, start=start, end=end, period=period, actions=actions).tz_localize(None)
+              for sym in symbols if not provider.is_missing(sym)}
+    if not frames:
+        return pd.DataFrame()
+    data = pd.concat(frames, axis=1)
+    return data if group_by == 'ticker' else data.swaplevel(axis=1).sort_index(axis=1)
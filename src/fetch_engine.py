@@ -0,0 +1,132 @@
+# src/fetch_engine.py
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from config import FETCH_ENGINE_WORKERS
+from src import disk_cache, replay
+from src.market_data import get_benchmark_history, load_history_incremental
+from src.utils import bind_log_capture
+from src.yahoo_client import call_yahoo
+
+# Orden en que se prueban las fuentes de EPS por año (la primera con datos gana)
+EPS_SOURCES = ('income_stmt', 'earnings', 'earnings_history', 'quarterly_financials')
+
+# Pool compartido por todos los tickers: acota el total de peticiones en vuelo
+_fetch_pool = ThreadPoolExecutor(max_workers=FETCH_ENGINE_WORKERS, thread_name_prefix='yf-fetch')
+
+# Datasets ya descargados de tickers cuya descarga falló a medias: al reintentar el
+# ticker solo se piden los que faltan.
+_partial_lock = threading.Lock()
+_partial_results = {}
+
+
+def _fetch_earnings(ticker, sources=EPS_SOURCES):
+    """Devuelve la primera fuente de EPS por año que tenga datos (ver EPS_SOURCES)."""
+    earnings_history = None
+    # Prefer income_stmt/financials for per-year rows like 'Basic EPS' or 'Diluted EPS'
+    for candidate in sources:
+        # hasattr() sobre la clase: sobre la instancia evaluaría la propiedad (otra descarga)
+        if hasattr(type(ticker), candidate):
+            try:
+                earnings_history = call_yahoo(candidate, getattr, ticker, candidate)
+                if isinstance(earnings_history, pd.DataFrame) and not earnings_history.empty:
+                    break
+            except Exception:
+                earnings_history = None
+    return earnings_history
+
+
+def _fetch_history(ticker):
+    # Solo las barras nuevas respecto al histórico guardado en disco
+    return load_history_incremental(
+        ticker.ticker,
+        lambda start, end: call_yahoo('history', ticker.history, start=start, end=end, interval='1d', actions=True))
+
+
+def _fetch_benchmark(ticker):
+    # Cache compartida por proceso: solo descarga si aún no está cargada o caducó
+    return get_benchmark_history()
+
+
+# Dataset -> función que lo obtiene a partir de un yf.Ticker (todas pasan por el limitador global)
+DATASET_FETCHERS = {
+    'financials': lambda ticker: call_yahoo('financials', getattr, ticker, 'financials'),
+    'balance_sheet': lambda ticker: call_yahoo('balance_sheet', getattr, ticker, 'balance_sheet'),
+    'earnings': _fetch_earnings,
+    'info': lambda ticker: call_yahoo('info', getattr, ticker, 'info') or {},
+    'history': _fetch_history,
+    'benchmark': _fetch_benchmark,
+}
+
+
+def has_partial_results(ticker_symbol: str) -> bool:
+    """Indica si el ticker falló a medias y tiene datasets ya descargados pendientes de reutilizar."""
+    with _partial_lock:
+        return ticker_symbol in _partial_results
+
+
+def clear_partial_results():
+    """Descarta los datasets guardados de descargas a medias (al terminar cada lote)."""
+    with _partial_lock:
+        _partial_results.clear()
+
+
+def fetch_datasets(ticker, datasets) -> dict:
+    """
+    Descarga en paralelo los datasets indicados de un yf.Ticker y devuelve {dataset: valor}.
+    El tiempo total se acerca al del endpoint más lento en lugar de a la suma de todos.
+    Si alguna descarga falla (tras los reintentos de call_yahoo) se guardan las que sí
+    funcionaron y se relanza la primera excepción (en el orden de `datasets`) una vez
+    terminadas todas.
+    """
+    if replay.is_replaying():
+        # --replay: todo sale del archivo grabado, sin cache, limitador ni red
+        return {name: get_benchmark_history() if name == 'benchmark' else replay.load(ticker.ticker, name)
+                for name in datasets}
+    with _partial_lock:
+        results = dict(_partial_results.get(ticker.ticker, {}))
+    # Cache en disco (el benchmark tiene su propia cache en market_data y 'earnings'
+    # sale de 'financials' cuando se piden ambos)
+    for name in datasets:
+        if name not in results and name != 'benchmark' and not (name == 'earnings' and 'financials' in datasets):
+            hit, value = disk_cache.load(ticker.ticker, name)
+            if hit:
+                results[name] = value
+    # ticker.financials es el mismo estado que ticker.income_stmt (primera fuente de EPS):
+    # si se piden ambos, 'earnings' reutiliza 'financials' en lugar de descargarlo otra vez.
+    earnings_from_financials = 'earnings' in datasets and 'financials' in datasets and 'earnings' not in results
+    futures = {name: _fetch_pool.submit(bind_log_capture(DATASET_FETCHERS[name]), ticker)
+               for name in datasets
+               if name not in results and not (name == 'earnings' and earnings_from_financials)}
+    first_error = None
+    for name, future in futures.items():
+        try:
+            results[name] = future.result()
+            if name != 'benchmark':
+                disk_cache.store(ticker.ticker, name, results[name])
+        except Exception as e:
+            logging.debug(f"Fallo al descargar '{name}' de {ticker.ticker}: {e}")
+            if first_error is None:
+                first_error = e
+    if earnings_from_financials and 'financials' in results:
+        financials = results['financials']
+        if isinstance(financials, pd.DataFrame) and not financials.empty:
+            results['earnings'] = financials
+        else:
+            results['earnings'] = _fetch_earnings(ticker, sources=EPS_SOURCES[1:])
+            disk_cache.store(ticker.ticker, 'earnings', results['earnings'])
+    if replay.is_recording():
+        for name in datasets:
+            if name in results and name != 'benchmark':
+                replay.record(ticker.ticker, name, results[name])
+    with _partial_lock:
+        if first_error is not None:
+            _partial_results[ticker.ticker] = results
+        else:
+            _partial_results.pop(ticker.ticker, None)
+    if first_error is not None:
+        raise first_error
+    return {name: results[name] for name in datasets}
@@ -0,0 +1,39 @@
+# src/fetch_planner.py
+
+from config import CSV_ROW_NAMES
+from src.metrics import DATASETS, required_datasets
+
+# Orden canónico de los datasets de Yahoo (el mismo que usa fetch_datasets)
+DATASET_ORDER = DATASETS
+
+# Datasets que siempre hacen falta: 'info' aporta el precio actual de la cabecera (as_of)
+BASE_DATASETS = {'info'}
+
+# Fila del CSV -> datasets de Yahoo que usa su fórmula, derivados del grafo de métricas
+ROW_DEPENDENCIES = {row: required_datasets([row]) for row in CSV_ROW_NAMES}
+
+
+def resolve_rows(metrics=None) -> list:
+    """
+    Devuelve las filas a calcular, en el orden de CSV_ROW_NAMES. `metrics` es una lista
+    (o un texto separado por comas) con un subconjunto de CSV_ROW_NAMES; None = todas.
+    Lanza ValueError si alguna métrica no existe.
+    """
+    if metrics is None:
+        return list(CSV_ROW_NAMES)
+    if isinstance(metrics, str):
+        metrics = [m.strip() for m in metrics.split(',') if m.strip()]
+    unknown = [m for m in metrics if m not in CSV_ROW_NAMES]
+    if unknown:
+        raise ValueError(f"Métricas desconocidas: {', '.join(unknown)}. Disponibles: {', '.join(CSV_ROW_NAMES)}")
+    wanted = set(metrics)
+    return [r for r in CSV_ROW_NAMES if r in wanted]
+
+
+def plan_datasets(rows=None) -> list:
+    """Datasets (sin repetir, en DATASET_ORDER) necesarios para calcular las filas indicadas."""
+    rows = CSV_ROW_NAMES if rows is None else rows
+    needed = set(BASE_DATASETS)
+    for row in rows:
+        needed |= ROW_DEPENDENCIES.get(row, set(DATASET_ORDER))
+    return [d for d in DATASET_ORDER if d in needed]
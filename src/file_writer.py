@@ -1,14 +1,362 @@
 # src/file_writer.py
 
-import pandas as pd
+import csv
+import numpy as np
 import os
 import logging
+import re
+import threading
+import xlsxwriter
 from datetime import datetime
-from config import OUTPUT_DIRECTORY, YEARS_TO_EXTRACT
+try:
+    import resource
+except ImportError:  # Windows: sin límite de archivos abiertos que ajustar
+    resource = None
+from config import BATCH_ORDER_MAX_PENDING, OUTPUT_DIRECTORY, SINGLE_WORKBOOK_TMPDIR, WRITE_CSV
+from src.long_export import LongFormatWriter
+from src.result import PERIODS, FundamentalsResult, to_float
+from src.utils import TickerOrderBuffer
 
-def save_to_csv(df: pd.DataFrame, ticker: str, *, red_cells, green_cells):
+# Secciones del CSV agrupado (dividend_and_split se expande en las filas 'dividends' y 'splits')
+REPRESENTATIVE_ROWS = ['marketCap', 'beta', 'peRatio', 'forwardDividendYield', 'EPS', '52WeekRange',
+                       'trailingPE', 'forwardPE', 'profitMargin', 'payoutRatio', 'ROE']
+FINANCIAL_ROWS = ['totalRevenue', 'totalRevenueChange', 'costOfRevenue', 'operatingExpense', 'netIncome', 'EBITDA',
+                  'net debts over EBITDA']
+BALANCE_ROWS = ['cash cash equivalence', 'total assets', 'total liabilities', 'working capital',
+                'invested capital', 'net debts', 'ordinary shared number', 'net tangible assets']
+
+# Secciones de la hoja, en orden (título, filas)
+SECTIONS = [('Valores representativos', REPRESENTATIVE_ROWS + ['dividends', 'splits']),
+            ('financials', FINANCIAL_ROWS),
+            ('balance sheets', BALANCE_ROWS)]
+
+# Filas de la hoja 'summary' del libro único (valor 'actual' de cada ticker)
+SUMMARY_ROWS = [m for m in REPRESENTATIVE_ROWS if m != '52WeekRange']
+
+# Formato de cada fila en el CSV legible (las que no aparecen se escriben sin formato)
+HUMAN_FORMATS = {
+    'marketCap': 'millions', 'totalRevenue': 'millions', 'costOfRevenue': 'millions',
+    'operatingExpense': 'millions', 'netIncome': 'millions', 'EBITDA': 'millions',
+    'cash cash equivalence': 'millions', 'total assets': 'millions', 'total liabilities': 'millions',
+    'working capital': 'millions', 'invested capital': 'millions', 'net debts': 'millions',
+    'net tangible assets': 'millions',
+    'EPS': 'number', 'trailingPE': 'number', 'forwardPE': 'number', 'beta': 'number', 'peRatio': 'number',
+    'profitMargin': 'percent', 'ROE': 'percent', 'payoutRatio': 'percent', 'forwardDividendYield': 'percent',
+    'totalRevenueChange': 'percent', 'net debts over EBITDA': 'percent',
+}
+
+
+# Formato Excel equivalente a cada formato legible (los números se guardan sin redondear)
+XLSX_FORMATS = {
+    None: {},
+    'millions': {'num_format': '#,##0.00,, "M"'},
+    'number': {'num_format': '#,##0.00'},
+    'percent': {'num_format': '0.00%'},
+    'date': {'num_format': 'yyyy-mm-dd'},
+    'section': {'bold': True},
+}
+
+# Escribir también los CSV (ver set_write_csv)
+_write_csv = WRITE_CSV
+# Archivos abiertos que se dejan libres además de los temporales del libro único
+# (sockets, cachés, logs...)
+FILE_DESCRIPTOR_MARGIN = 256
+# Libro único de la ejecución en curso (ver open_batch_workbook); None = un .xlsx por ticker
+_batch_workbook = None
+# Exportación Parquet del lote en curso (ver open_batch_export); None = sin exportación
+_batch_export = None
+
+
+def format_cells(values: np.ndarray, fmt=None) -> list:
+    """
+    Celdas de texto de una fila float64 (NaN = celda vacía). fmt: 'millions', 'number' o
+    'percent' (CSV legible) o None (valor tal cual). El escalado es una operación sobre toda la fila.
+    """
+    values = np.asarray(values, dtype='float64')
+    missing = np.isnan(values)
+    if fmt == 'millions':
+        cells = [f"{v:,.2f} M" for v in values / 1_000_000.0]
+    elif fmt == 'number':
+        cells = [f"{v:,.2f}" for v in values]
+    elif fmt == 'percent':
+        cells = [f"{v:.2f}%" for v in values * 100]
+    else:
+        cells = [float(v) for v in values]
+    return ['' if miss else cell for miss, cell in zip(missing, cells)]
+
+
+def format_ranges(low: np.ndarray, high: np.ndarray, human_readable: bool) -> list:
+    """Celdas 'min-max' de 52WeekRange (un decimal por extremo en el CSV legible)."""
+    missing = np.isnan(low) | np.isnan(high)
+    if human_readable:
+        cells = [f"{a:.1f}-{b:.1f}" for a, b in zip(low, high)]
+    else:
+        cells = [f"{float(a)}-{float(b)}" for a, b in zip(low, high)]
+    return ['' if miss else cell for miss, cell in zip(missing, cells)]
+
+
+def _sheet_rows(result: FundamentalsResult):
+    """
+    Disposición común del CSV agrupado y de la hoja Excel: genera (etiqueta, tipo, datos)
+    por línea, con tipo 'section' (cabecera de sección), 'blank', 'range' (low, high),
+    'splits' (textos) o el formato de HUMAN_FORMATS para las filas numéricas (datos float64).
+    """
+    for title, metrics in SECTIONS:
+        yield '', 'blank', None
+        yield title, 'section', PERIODS
+        for m in metrics:
+            if m == '52WeekRange':
+                yield m, 'range', result.range_bounds()
+            elif m == 'dividends':
+                # dividend_and_split expandido (tabla de eventos corporativos)
+                yield m, 'number', np.array([to_float(result.dividends(c)) for c in PERIODS])
+            elif m == 'splits':
+                yield m, 'splits', [';'.join(result.splits(c)) for c in PERIODS]
+            else:
+                yield m, HUMAN_FORMATS.get(m), result.row(m)
+
+
+def write_grouped_csv(result: FundamentalsResult, ticker: str, path: str, human_readable: bool):
+    """CSV agrupado por secciones: valores tal cual (raw) o con HUMAN_FORMATS (readable)."""
+    with open(path, 'w', newline='', encoding='utf-8-sig') as csvfile:
+        writer = csv.writer(csvfile)
+        # First row: ticker (A1), date (B1) and current price (C1)
+        price_cell = '' if result.price is None else result.price
+        writer.writerow([ticker, result.as_of.strftime("%Y-%m-%d"), price_cell])
+        for label, kind, data in _sheet_rows(result):
+            if kind == 'blank':
+                writer.writerow([])
+            elif kind == 'section':
+                writer.writerow([label] + list(data))
+            elif kind == 'range':
+                writer.writerow([label] + format_ranges(*data, human_readable))
+            elif kind == 'splits':
+                writer.writerow([label] + data)
+            else:
+                writer.writerow([label] + format_cells(data, kind if human_readable else None))
+
+
+def write_xlsx(result: FundamentalsResult, ticker: str, path: str, red_cells=(), green_cells=()):
+    """
+    Hoja Excel con la disposición del CSV legible, escrita directamente desde el resultado:
+    los números se guardan como números con el formato de su fila (millones, número o
+    porcentaje) y los formatos de celda se crean una vez por libro. red_cells / green_cells:
+    posiciones (fila, columna) 0-based de la hoja a resaltar en rojo / verde.
+    """
+    workbook = xlsxwriter.Workbook(path)
+    try:
+        _write_sheet(workbook.add_worksheet('Sheet1'), _workbook_formats(workbook), result, ticker,
+                     red_cells, green_cells)
+    finally:
+        workbook.close()
+
+
+def _write_sheet(worksheet, formats: dict, result: FundamentalsResult, ticker: str, red_cells=(), green_cells=()):
+    """Escribe el resultado en `worksheet` fila a fila y en orden."""
+    highlight = {**{tuple(c): 'red' for c in red_cells}, **{tuple(c): 'green' for c in green_cells}}
+
+    worksheet.set_column(0, 0, 24)
+    worksheet.set_column(1, len(PERIODS), 16)
+    worksheet.write_string(0, 0, ticker, formats[(None, highlight.get((0, 0)))])
+    worksheet.write_datetime(0, 1, result.as_of, formats[('date', highlight.get((0, 1)))])
+    if result.price is not None:
+        worksheet.write_number(0, 2, result.price, formats[(None, highlight.get((0, 2)))])
+
+    for r, (label, kind, data) in enumerate(_sheet_rows(result), start=1):
+        if kind == 'blank':
+            continue
+        worksheet.write_string(r, 0, label, formats[('section' if kind == 'section' else None, highlight.get((r, 0)))])
+        if kind == 'section':
+            cells, fmt = [str(p) for p in data], 'section'
+        elif kind == 'range':
+            cells, fmt = format_ranges(*data, human_readable=True), None
+        elif kind == 'splits':
+            cells, fmt = data, None
+        else:
+            cells, fmt = data, kind
+        for c, value in enumerate(cells, start=1):
+            cell_format = formats[(fmt, highlight.get((r, c)))]
+            if isinstance(value, str):
+                if value:
+                    worksheet.write_string(r, c, value, cell_format)
+                elif (r, c) in highlight:
+                    worksheet.write_blank(r, c, None, cell_format)
+            elif np.isnan(value):
+                if (r, c) in highlight:
+                    worksheet.write_blank(r, c, None, cell_format)
+            else:
+                worksheet.write_number(r, c, float(value), cell_format)
+
+
+def _sheet_name(ticker: str, used: set) -> str:
+    """Nombre de hoja válido en Excel (31 caracteres, sin []:*?/\\) y único sin mayúsculas."""
+    base = re.sub(r'[\[\]:*?/\\]', '_', ticker)[:31] or '_'
+    name, n = base, 1
+    while name.lower() in used:
+        n += 1
+        name = f"{base[:31 - len(str(n)) - 1]}~{n}"
+    used.add(name.lower())
+    return name
+
+
+class BatchWorkbook:
+    """
+    Libro único de una ejecución: una hoja por ticker (la disposición de write_xlsx) y la
+    hoja 'summary' con una fila por ticker (enlace a su hoja, fecha, cotización y el valor
+    'actual' de SUMMARY_ROWS). Usa el modo constant_memory de xlsxwriter: cada fila se
+    vuelca al temporal de su hoja (en `tmpdir`) al pasar a la siguiente, así que las celdas
+    no se acumulan en memoria; los formatos se crean una vez y se comparten entre todas.
+    Las hojas y las filas del resumen siguen el orden de `tickers` (el del archivo), no el
+    de llegada: add() se puede llamar desde varios hilos y cada resultado espera a que se
+    hayan añadido (o descartado con skip()) los tickers anteriores, con como mucho
+    `max_pending` resultados esperando (ver TickerOrderBuffer).
+    """
+
+    def __init__(self, path: str, tickers=(), tmpdir=SINGLE_WORKBOOK_TMPDIR, max_pending=BATCH_ORDER_MAX_PENDING):
+        self.path = path
+        self._lock = threading.Lock()
+        self._order = TickerOrderBuffer(tickers, max_pending=max_pending)
+        # Cada hoja mantiene abierto su temporal hasta close(): hoja 'summary' + una por ticker
+        _reserve_file_descriptors(len(tickers) + 1)
+        self._workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'tmpdir': tmpdir})
+        self._formats = _workbook_formats(self._workbook)
+        self._used_names = set()
+        self._summary = self._workbook.add_worksheet(_sheet_name('summary', self._used_names))
+        self._summary.set_column(0, 0, 12)
+        self._summary.set_column(1, 2 + len(SUMMARY_ROWS), 16)
+        header = ['ticker', 'as_of', 'price'] + SUMMARY_ROWS
+        for c, title in enumerate(header):
+            self._summary.write_string(0, c, title, self._formats[('section', None)])
+        self._summary_row = 1
+
+    def add(self, result: FundamentalsResult, ticker: str, red_cells=(), green_cells=()):
+        """Añade la hoja del ticker y su fila de resumen en su turno."""
+        with self._lock:
+            for item in self._order.put(ticker, (result, ticker, red_cells, green_cells)):
+                self._write(*item)
+
+    def skip(self, ticker: str):
+        """El ticker no tendrá hoja: los siguientes dejan de esperarlo."""
+        with self._lock:
+            for item in self._order.skip(ticker):
+                self._write(*item)
+
+    def _write(self, result: FundamentalsResult, ticker: str, red_cells, green_cells):
+        name = _sheet_name(ticker, self._used_names)
+        _write_sheet(self._workbook.add_worksheet(name), self._formats, result, ticker, red_cells, green_cells)
+
+        r = self._summary_row
+        self._summary_row += 1
+        self._summary.write_url(r, 0, f"internal:'{name}'!A1", string=ticker)
+        self._summary.write_datetime(r, 1, result.as_of, self._formats[('date', None)])
+        if result.price is not None:
+            self._summary.write_number(r, 2, result.price, self._formats[(None, None)])
+        for c, m in enumerate(SUMMARY_ROWS, start=3):
+            value = result.row(m)[-1]
+            if not np.isnan(value):
+                self._summary.write_number(r, c, float(value), self._formats[(HUMAN_FORMATS.get(m), None)])
+
+    def close(self):
+        with self._lock:
+            # Los que aún esperan a un ticker que no llegó (p. ej. falló) van en su orden
+            for item in self._order.drain():
+                self._write(*item)
+            self._workbook.close()
+
+
+def _reserve_file_descriptors(count: int):
+    """
+    Sube el límite blando de archivos abiertos del proceso (sin pasar del duro) para que
+    quepan `count` más, p. ej. los temporales de las hojas en modo constant_memory.
+    """
+    if resource is None:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    needed = count + FILE_DESCRIPTOR_MARGIN
+    if soft == resource.RLIM_INFINITY or soft >= needed:
+        return
+    target = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+    if target < needed:
+        logging.warning(f"El límite de archivos abiertos ({hard}) no alcanza para {count} hojas; "
+                        f"el libro único puede fallar al añadir las últimas.")
+
+
+def _workbook_formats(workbook) -> dict:
+    """Formatos de celda del libro por (formato de fila, resaltado), creados una sola vez."""
+    formats = {}
+    for fmt, props in XLSX_FORMATS.items():
+        for colour, fill in (None, {}), ('red', {'bg_color': '#FF0000', 'font_color': '#000000'}), \
+                             ('green', {'bg_color': '#00FF00', 'font_color': '#000000'}):
+            formats[(fmt, colour)] = workbook.add_format({**props, **fill})
+    return formats
+
+
+def set_write_csv(enabled: bool):
+    """Activa/desactiva la escritura de los CSV raw y readable (--csv) junto al .xlsx."""
+    global _write_csv
+    _write_csv = bool(enabled)
+
+
+def open_batch_workbook(tickers=()) -> str:
+    """
+    Abre el libro único de la ejecución (ver BatchWorkbook): desde aquí y hasta
+    close_batch_workbook, save_result añade una hoja por ticker en lugar de crear un .xlsx,
+    en el orden de `tickers`. Devuelve su ruta.
+    """
+    global _batch_workbook
+    if not os.path.exists(OUTPUT_DIRECTORY):
+        os.makedirs(OUTPUT_DIRECTORY)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    _batch_workbook = BatchWorkbook(os.path.join(OUTPUT_DIRECTORY, f"batch_annual_data_{timestamp}.xlsx"), tickers)
+    return _batch_workbook.path
+
+
+def close_batch_workbook():
+    """Cierra (escribe en disco) el libro único abierto, si lo hay."""
+    global _batch_workbook
+    book, _batch_workbook = _batch_workbook, None
+    if book is not None:
+        book.close()
+
+
+def skip_batch_result(ticker: str):
+    """
+    El ticker no tendrá salida (falló): el libro único y la exportación Parquet dejan de
+    esperarlo para mantener el orden del archivo.
+    """
+    if _batch_workbook is not None:
+        _batch_workbook.skip(ticker)
+    if _batch_export is not None:
+        _batch_export.skip(ticker)
+
+
+def open_batch_export(tickers=()) -> str:
+    """
+    Abre la exportación en formato largo del lote (ver LongFormatWriter): hasta
+    close_batch_export, save_result añade ahí también cada ticker, en el orden de
+    `tickers`. Devuelve su ruta.
+    """
+    global _batch_export
+    _batch_export = LongFormatWriter(tickers)
+    return _batch_export.path
+
+
+def close_batch_export():
+    """Escribe lo pendiente y cierra la exportación abierta, si la hay."""
+    global _batch_export
+    export, _batch_export = _batch_export, None
+    if export is not None:
+        export.close()
+
+
+def save_result(result: FundamentalsResult, ticker: str, *, red_cells, green_cells):
     """
-    Guarda el DataFrame en un archivo CSV en el directorio de salida.
+    Guarda el resultado (FundamentalsResult) en el directorio de salida: el .xlsx legible
+    (o su hoja del libro único si hay uno abierto, ver open_batch_workbook), sus filas en
+    la exportación Parquet del lote si la hay (ver open_batch_export) y, si se pidieron
+    (WRITE_CSV / --csv), los CSV raw y readable.
+    Devuelve la lista de rutas escritas, o None si hubo un error.
     """
     try:
         # Asegurarse que el directorio de salida exista
@@ -19,209 +367,34 @@ def save_to_csv(df: pd.DataFrame, ticker: str, *, red_cells, green_cells):
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"{ticker}_annual_data_{timestamp}.csv"
         filepath = os.path.join(OUTPUT_DIRECTORY, filename)
+        written = []
 
-        # We'll produce two CSVs: a raw machine-friendly CSV and a human-readable CSV.
-        years = list(YEARS_TO_EXTRACT)
-        cols_order = years + ['actual']
-
-        import csv
-
-        def _format_number_for_human(val, scale='M'):
-            if val is None or (isinstance(val, float) and pd.isna(val)):
-                return ''
-            try:
-                v = float(val)
-            except Exception:
-                return str(val)
-            if scale == 'M':
-                v_scaled = v / 1_000_000.0
-                return f"{v_scaled:,.2f} M"
-            if scale == 'B':
-                v_scaled = v / 1_000_000_000.0
-                return f"{v_scaled:,.2f} B"
-            return f"{v:,.2f}"
-
-        def _format_52week_range(val):
-            """Format a range like 'min-max' to one decimal place per endpoint."""
-            if val is None or (isinstance(val, float) and pd.isna(val)):
-                return ''
-            try:
-                s = str(val)
-                if '-' in s:
-                    parts = s.split('-')
-                    if len(parts) >= 2:
-                        a = float(parts[0])
-                        b = float(parts[1])
-                        return f"{a:.1f}-{b:.1f}"
-                # fallback: try to parse single number
-                num = float(s)
-                return f"{num:.1f}"
-            except Exception:
-                return s
-
-        def _format_percent(val):
-            if val is None or (isinstance(val, float) and pd.isna(val)):
-                return ''
-            try:
-                return f"{float(val) * 100:.2f}%"
-            except Exception:
-                return str(val)
-
-        def _write_grouped_csv(path, human_readable: bool):
-            with open(path, 'w', newline='', encoding='utf-8-sig') as csvfile:
-                writer = csv.writer(csvfile)
-                # First row: ticker (A1), date (B1) and current price (C1)
-                as_of_raw = ''
-                if 'as_of' in df.columns:
-                    try:
-                        as_of_raw = df.iloc[0]['as_of']
-                    except Exception:
-                        as_of_raw = ''
-                date_cell = ''
-                price_cell = ''
-                if isinstance(as_of_raw, str) and '|' in as_of_raw:
-                    parts = [p.strip() for p in as_of_raw.split('|', 1)]
-                    if len(parts) >= 1:
-                        date_cell = parts[0]
-                    if len(parts) == 2:
-                        price_cell = parts[1]
-                else:
-                    # fallback: try to read 'actual' price from df or leave empty
-                    price_cell = ''
-
-                writer.writerow([ticker, date_cell, price_cell])
-                writer.writerow([])
+        if _write_csv:
+            # Two CSVs: a raw machine-friendly CSV and a human-readable CSV
+            raw_path = filepath.replace('.csv', '_raw.csv')
+            write_grouped_csv(result, ticker, raw_path, human_readable=False)
+            logging.info(f"Archivo raw guardado exitosamente en: {raw_path}")
 
-                # Valores representativos
-                writer.writerow(['Valores representativos'] + cols_order)
-
-                # Define rep metrics but expand dividends into two rows: 'dividends' and 'splits'
-                rep_metrics = [
-                    'marketCap', 'beta', 'peRatio', 'forwardDividendYield', 'EPS', '52WeekRange',
-                    'trailingPE', 'forwardPE', 'profitMargin', 'payoutRatio', 'ROE'
-                ]
-
-                for m in rep_metrics:
-                    row = [m]
-                    for c in cols_order:
-                        val = df.at[m, c] if m in df.index else None
-                        if human_readable:
-                            if m in ('marketCap',):
-                                out = _format_number_for_human(val, scale='M')
-                            elif m in ('totalRevenue', 'costOfRevenue'):
-                                out = _format_number_for_human(val, scale='M')
-                            elif m in ('operatingExpense', 'netIncome'):
-                                out = _format_number_for_human(val, scale='M')
-                            elif m in ('profitMargin', 'ROE', 'payoutRatio', 'forwardDividendYield'):
-                                out = _format_percent(val)
-                            elif m in ('EPS', 'trailingPE', 'forwardPE', 'beta', 'peRatio'):
-                                out = _format_number_for_human(val, scale=None)
-                            elif m == '52WeekRange':
-                                out = _format_52week_range(val)
-                            else:
-                                out = '' if pd.isna(val) else str(val)
-                        else:
-                            # raw
-                            out = '' if pd.isna(val) else val
-                        row.append(out)
-                    writer.writerow(row)
-
-                # dividends and splits expanded
-                # dividends row
-                drow = ['dividends']
-                srow = ['splits']
-                for c in cols_order:
-                    raw = df.at['dividend_and_split', c] if 'dividend_and_split' in df.index else None
-                    if isinstance(raw, dict):
-                        div = raw.get('dividends')
-                        splits = raw.get('splits')
-                    else:
-                        div = None
-                        splits = None
-                    if human_readable:
-                        drow.append('' if pd.isna(div) or div is None else _format_number_for_human(div, scale=None))
-                        # splits: list -> join
-                        if isinstance(splits, list):
-                            srow.append(';'.join(splits) if splits else '')
-                        else:
-                            srow.append('' if splits is None else str(splits))
-                    else:
-                        drow.append('' if pd.isna(div) or div is None else div)
-                        if isinstance(splits, list):
-                            srow.append(';'.join(splits) if splits else '')
-                        else:
-                            srow.append('' if splits is None else str(splits))
-                writer.writerow(drow)
-                writer.writerow(srow)
-
-                # Financials
-                writer.writerow([])
-                writer.writerow(['financials'] + cols_order)
-                fin_metrics = ['totalRevenue', 'totalRevenueChange', 'costOfRevenue', 'operatingExpense', 'netIncome', 'EBITDA', 'net debts over EBITDA']
-                for m in fin_metrics:
-                    row = [m]
-                    for c in cols_order:
-                        val = df.at[m, c] if m in df.index else None
-                        if human_readable and m in ('totalRevenue', 'costOfRevenue', 'operatingExpense', 'netIncome', 'EBITDA'):
-                            out = _format_number_for_human(val, scale='M')
-                        elif human_readable and m in ('totalRevenueChange', 'net debts over EBITDA',):
-                            out = _format_percent(val)
-                        else:
-                            out = '' if pd.isna(val) else val
-                        row.append(out)
-                    writer.writerow(row)
-
-                # Balance sheets
-                writer.writerow([])
-                writer.writerow(['balance sheets'] + cols_order)
-                bs_metrics = [
-                    'cash cash equivalence', 'total assets', 'total liabilities', 'working capital',
-                    'invested capital', 'net debts', 'ordinary shared number', 'net tangible assets'
-                ]
-                for m in bs_metrics:
-                    row = [m]
-                    for c in cols_order:
-                        val = df.at[m, c] if m in df.index else None
-                        if human_readable and m in ('cash cash equivalence', 'total assets', 'invested capital', 'net debts', 'net tangible assets', 'total liabilities', 'working capital'):
-                            out = _format_number_for_human(val, scale='M')
-                        else:
-                            out = '' if pd.isna(val) else val
-                        row.append(out)
-                    writer.writerow(row)
-
-        # write raw file
-        raw_path = filepath.replace('.csv', '_raw.csv')
-        _write_grouped_csv(raw_path, human_readable=False)
-        logging.info(f"Archivo raw guardado exitosamente en: {raw_path}")
-
-        # write readable file
-        readable_path = filepath.replace('.csv', '_readable.csv')
-        _write_grouped_csv(readable_path, human_readable=True)
-        logging.info(f"Archivo readable guardado exitosamente en: {readable_path}")
-
-        readable_xlsx_path = readable_path.replace('.csv', '.xlsx')
-        writer = pd.ExcelWriter(readable_xlsx_path, engine='xlsxwriter')
-
-        pd.read_csv(readable_path).to_excel(writer, sheet_name='Sheet1', engine='xlsxwriter')
-
-        workbook = writer.book
-        worksheet = writer.sheets['Sheet1']
-
-        red   = workbook.add_format({'bg_color':   '#FF0000',
-                                     'font_color': '#000000'})
-        green = workbook.add_format({'bg_color':   '#00FF00',
-                                     'font_color': '#000000'})
-
-        for row, col in red_cells:
-            worksheet.write(row, col, str(worksheet.table[row][col][0]), red)
-
-        for row, col in green_cells:
-            worksheet.write(row, col, str(worksheet.table[row][col][0]), green)
-
-        writer.close()
-
-        return raw_path, readable_path
+            readable_path = filepath.replace('.csv', '_readable.csv')
+            write_grouped_csv(result, ticker, readable_path, human_readable=True)
+            logging.info(f"Archivo readable guardado exitosamente en: {readable_path}")
+            written += [raw_path, readable_path]
+
+        if _batch_export is not None:
+            _batch_export.add(result, ticker)
+
+        if _batch_workbook is not None:
+            _batch_workbook.add(result, ticker, red_cells=red_cells or (), green_cells=green_cells or ())
+            logging.info(f"Hoja de {ticker} añadida al libro: {_batch_workbook.path}")
+            written.append(_batch_workbook.path)
+            return written
+
+        readable_xlsx_path = filepath.replace('.csv', '_readable.xlsx')
+        write_xlsx(result, ticker, readable_xlsx_path, red_cells=red_cells or (), green_cells=green_cells or ())
+        logging.info(f"Archivo xlsx guardado exitosamente en: {readable_xlsx_path}")
+        written.append(readable_xlsx_path)
+        return written
 
     except Exception as e:
-        logging.error(f"Error al guardar el archivo CSV: {e}")
+        logging.error(f"Error al guardar los archivos de salida: {e}")
         return None
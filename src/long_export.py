@@ -0,0 +1,120 @@
+# src/long_export.py
+
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from config import BATCH_ORDER_MAX_PENDING, PARQUET_DIRECTORY, PARQUET_ROW_GROUP_TICKERS
+from src.result import PERIODS, FundamentalsResult, to_float
+from src.utils import TickerOrderBuffer
+
+# Tabla larga: una fila por (ticker, métrica, periodo) con dato. Las columnas de texto van
+# como diccionario (categorías al leer con pandas) y los periodos como texto ('2024', 'actual')
+LONG_SCHEMA = pa.schema([
+    ('ticker', pa.dictionary(pa.int32(), pa.string())),
+    ('metric', pa.dictionary(pa.int32(), pa.string())),
+    ('period', pa.dictionary(pa.int32(), pa.string())),
+    ('value', pa.float64()),
+    ('as_of', pa.timestamp('us')),
+])
+PERIOD_LABELS = [str(p) for p in PERIODS]
+# Métricas de la tabla larga para 52WeekRange y la tabla de eventos corporativos
+RANGE_METRICS = ('52WeekRange_low', '52WeekRange_high')
+ACTION_METRICS = {'dividend': 'dividends', 'split': 'splits'}
+
+
+def long_frame(result: FundamentalsResult) -> pd.DataFrame:
+    """
+    Resultado de un ticker en formato largo (ticker, metric, period, value, as_of), sin las
+    celdas vacías. 52WeekRange se separa en RANGE_METRICS y los eventos corporativos van
+    como 'dividends' (importe) y 'splits' (factor numérico, una fila por split).
+    """
+    n_periods = len(PERIODS)
+    metrics = [np.repeat(result.values.index.to_numpy(dtype=object), n_periods)]
+    periods = [np.tile(PERIOD_LABELS, len(result.values.index))]
+    values = [result.values.to_numpy(dtype='float64').ravel()]
+    if result.ranges is not None:
+        for metric, column in zip(RANGE_METRICS, ('low', 'high')):
+            metrics.append(np.full(n_periods, metric, dtype=object))
+            periods.append(np.array(PERIOD_LABELS))
+            values.append(result.ranges[column].to_numpy(dtype='float64'))
+    if result.actions is not None and not result.actions.empty:
+        actions = result.actions
+        metrics.append(actions['kind'].astype(str).map(ACTION_METRICS).to_numpy(dtype=object))
+        periods.append(actions['period'].astype(str).to_numpy(dtype=object))
+        values.append(np.where(actions['kind'] == 'dividend', actions['amount'].to_numpy(dtype='float64'),
+                               [to_float(f) for f in actions['factor'].astype(object)]))
+
+    value = np.concatenate(values)
+    keep = ~np.isnan(value)
+    return pd.DataFrame({
+        'ticker': result.ticker,
+        'metric': np.concatenate(metrics)[keep],
+        'period': np.concatenate(periods)[keep],
+        'value': value[keep],
+        'as_of': pd.Timestamp(result.as_of),
+    })
+
+
+class LongFormatWriter:
+    """
+    Exportación en columnas de todo el lote: un único archivo Parquet con la tabla larga
+    (LONG_SCHEMA) de cada ticker, dentro de la partición as_of_date=AAAA-MM-DD de
+    `directory`, de modo que pd.read_parquet(directory) lee todas las ejecuciones de una
+    vez. Los tickers se acumulan y se escriben como un row group cada `row_group_tickers`;
+    el archivo se escribe con otro nombre y se renombra al cerrar, así que un lector nunca
+    ve uno a medias. Las filas siguen el orden de `tickers` (el del archivo), no el de
+    llegada: add() se puede llamar desde varios hilos y cada ticker espera a que se hayan
+    añadido (o descartado con skip()) los anteriores, con como mucho `max_pending`
+    tickers esperando (ver TickerOrderBuffer).
+    """
+
+    def __init__(self, tickers=(), directory: str = PARQUET_DIRECTORY,
+                 row_group_tickers: int = PARQUET_ROW_GROUP_TICKERS, max_pending: int = BATCH_ORDER_MAX_PENDING):
+        now = datetime.now()
+        partition = os.path.join(directory, f"as_of_date={now:%Y-%m-%d}")
+        os.makedirs(partition, exist_ok=True)
+        # Microsegundos y pid: dos ejecuciones que empiezan en el mismo segundo no se pisan
+        name = f"fundamentals_{now:%Y%m%d_%H%M%S_%f}_{os.getpid()}.parquet"
+        self.path = os.path.join(partition, name)
+        # El prefijo '.' hace que pd.read_parquet(directory) ignore el archivo a medias
+        # (también el que deje una ejecución interrumpida antes de close())
+        self._tmp_path = os.path.join(partition, f".{name}.{threading.get_ident()}.tmp")
+        self._row_group_tickers = max(1, row_group_tickers)
+        self._lock = threading.Lock()
+        self._order = TickerOrderBuffer(tickers, max_pending=max_pending)
+        self._pending = []
+        self._writer = pq.ParquetWriter(self._tmp_path, LONG_SCHEMA)
+
+    def add(self, result: FundamentalsResult, ticker: str):
+        frame = long_frame(result)
+        with self._lock:
+            self._extend(self._order.put(ticker, frame))
+
+    def skip(self, ticker: str):
+        """El ticker no tendrá filas: los siguientes dejan de esperarlo."""
+        with self._lock:
+            self._extend(self._order.skip(ticker))
+
+    def _extend(self, frames):
+        for frame in frames:
+            self._pending.append(frame)
+            if len(self._pending) >= self._row_group_tickers:
+                self._flush()
+
+    def _flush(self):
+        if self._pending:
+            chunk = pd.concat(self._pending, ignore_index=True)
+            self._pending = []
+            self._writer.write_table(pa.Table.from_pandas(chunk, schema=LONG_SCHEMA, preserve_index=False))
+
+    def close(self):
+        with self._lock:
+            self._extend(self._order.drain())
+            self._flush()
+            self._writer.close()
+            os.replace(self._tmp_path, self.path)
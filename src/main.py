@@ -4,30 +4,116 @@ import argparse
 import logging
 #from src.data_fetcher import get_stock_fundamentals
 from src.data_fetcher import get_annual_fundamentals
-from src.file_writer import save_to_csv
+from src.market_data import get_benchmark_history, get_batch_price_history
+from config import CSV_ROW_NAMES, PARQUET_EXPORT, SINGLE_WORKBOOK, YEARS_TO_EXTRACT
+from src import disk_cache, file_writer, replay
+from src.beta import precompute_batch_betas
+from src.fetch_engine import clear_partial_results, has_partial_results
+from src.fetch_planner import plan_datasets, resolve_rows
+from src.rate_limiter import get_rate_limiter
+from src.yahoo_client import get_call_stats
+from src.pipeline import run_panel_batch, run_staged_pipeline, write_ticker
 from src.utils import setup_logging
 
-def run_pipeline(ticker: str):
+def fetch_ticker(ticker: str, market_hist=None, price_hist=None, rows=None):
+    """
+    Obtiene los datos fundamentales de un ticker (paso de red del pipeline).
+    Devuelve la tupla (result, red_cells, green_cells) de get_annual_fundamentals.
+    """
+    logging.info(f"Iniciando proceso para el ticker: {ticker.upper()}...")
+    return get_annual_fundamentals(ticker, market_hist=market_hist, price_hist=price_hist, rows=rows)
+
+
+def run_pipeline(ticker: str, market_hist=None, price_hist=None, rows=None) -> bool:
     """
     Orquesta el flujo principal de la aplicación.
     1. Obtiene datos
     2. Guarda datos
     """
-    logging.info(f"Iniciando proceso para el ticker: {ticker.upper()}...")
-    
-    # 1. Obtener datos
-    data_df, red_cells, green_cells = get_annual_fundamentals(ticker)
-    
-    # 2. Guardar datos
-    if data_df is not None and not data_df.empty:
-        logging.info("Datos fundamentales extraídos:")
-        # Imprime el DataFrame como un string limpio
-        logging.info("\n" + data_df.to_string(index=False))
-        
-        save_to_csv(data_df, ticker, red_cells=red_cells, green_cells=green_cells)
-        logging.info(f"Proceso completado para {ticker.upper()}.")
+    return write_ticker(ticker, fetch_ticker(ticker, market_hist=market_hist, price_hist=price_hist, rows=rows))
+
+
+def _run_tickers(tickers, workers, market_hist, price_hists, rows, panel=False):
+    """
+    Procesa los tickers (con el pipeline por etapas si workers > 1, o como un único panel
+    si panel=True) y devuelve los que fallaron, en orden.
+    """
+    failed = []
+    if panel:
+        failed = run_panel_batch(tickers, fetch_workers=workers, market_hist=market_hist,
+                                 price_hists=price_hists, rows=rows)
+    elif workers <= 1:
+        for t in tickers:
+            if not run_pipeline(t, market_hist=market_hist, price_hist=price_hists.get(t), rows=rows):
+                failed.append(t)
     else:
-        logging.warning(f"No se generó ningún archivo CSV para {ticker.upper()} debido a errores previos.")
+        # Descarga, cálculo y escritura solapados en un pipeline por etapas
+        failed = run_staged_pipeline(tickers, fetch_workers=workers, market_hist=market_hist,
+                                     price_hists=price_hists, rows=rows)
+    return failed
+
+
+def run_batch(tickers, workers: int = 1, rows=None, panel: bool = False, single_workbook: bool = SINGLE_WORKBOOK,
+              parquet_export: bool = PARQUET_EXPORT):
+    """
+    Procesa una lista de tickers. Con workers > 1 se usan `workers` hilos de descarga
+    dentro del pipeline por etapas (ver run_staged_pipeline); los logs y el resumen se
+    emiten siempre en el orden de la lista, por lo que la salida es determinista.
+    rows: subconjunto de CSV_ROW_NAMES a calcular; solo se descarga lo que necesitan.
+    panel: calcula todo el lote de una vez como un panel numérico (ver src/panel.py).
+    single_workbook: escribe un único .xlsx con una hoja por ticker (ver BatchWorkbook).
+    parquet_export: exporta el lote como tabla larga en Parquet (ver LongFormatWriter).
+    Devuelve la lista de tickers que fallaron.
+    """
+    planned = plan_datasets(rows)
+    # El benchmark se descarga una sola vez y se comparte (solo lectura) entre tickers
+    market_hist = get_benchmark_history() if 'benchmark' in planned else None
+    # Históricos diarios de todo el universo en pocas llamadas agrupadas
+    price_hists = get_batch_price_history(tickers) if 'history' in planned else {}
+    if not panel and 'beta' in (rows or CSV_ROW_NAMES) and market_hist is not None and price_hists:
+        # Betas anuales de todo el lote frente al benchmark en una sola operación matricial
+        precompute_batch_betas(price_hists, market_hist, YEARS_TO_EXTRACT)
+    workbook_path = file_writer.open_batch_workbook(tickers) if single_workbook else None
+    export_path = file_writer.open_batch_export(tickers) if parquet_export else None
+    try:
+        failed = _run_tickers(tickers, workers, market_hist, price_hists, rows, panel)
+
+        # Segunda pasada para los tickers que fallaron a mitad de descarga: solo se
+        # vuelven a pedir los datasets que no llegaron en la primera.
+        retry = [t for t in failed if has_partial_results(t.upper())]
+        if retry:
+            logging.info(f"Reintentando {len(retry)} tickers con descargas incompletas: {', '.join(t.upper() for t in retry)}")
+            still_failed = set(_run_tickers(retry, workers, market_hist, price_hists, rows, panel))
+            failed = [t for t in failed if t not in retry or t in still_failed]
+    finally:
+        # Lo que quede de tickers que no se recuperaron no sirve para el siguiente lote
+        clear_partial_results()
+        if workbook_path is not None:
+            file_writer.close_batch_workbook()
+            logging.info(f"Libro del lote guardado en: {workbook_path}")
+        if export_path is not None:
+            file_writer.close_batch_export()
+            logging.info(f"Exportación Parquet del lote guardada en: {export_path}")
+
+    ok = len(tickers) - len(failed)
+    logging.info(f"Resumen: {ok}/{len(tickers)} tickers procesados correctamente.")
+    if failed:
+        logging.warning(f"Tickers sin salida: {', '.join(t.upper() for t in failed)}")
+    return failed
+
+
+def log_run_stats():
+    """Registra los contadores de la ejecución: limitador, reintentos y circuit breakers."""
+    stats = get_call_stats()
+    logging.info(f"Estado del limitador de Yahoo: {get_rate_limiter().stats()}")
+    logging.info(f"Llamadas a Yahoo por endpoint: {stats['calls']}")
+    if stats['retries'] or stats['failures']:
+        logging.info(f"Reintentos por endpoint: {stats['retries']}; fallos definitivos: {stats['failures']}")
+    if stats['breaker_trips'] or stats['rejected']:
+        logging.warning(f"Circuit breakers abiertos: {stats['breaker_trips']}; llamadas rechazadas: {stats['rejected']}")
+    cache = disk_cache.get_cache_stats()
+    logging.info(f"Cache en disco - aciertos: {cache['hits']}; fallos: {cache['misses']}; caducadas: {cache['stale']}")
+
 
 def main():
     """Punto de entrada principal con parsing de argumentos."""
@@ -54,8 +140,83 @@ def main():
         type=str,
         help="Ruta a un archivo de texto con una lista de tickers (uno por línea). Ejemplo: tickers.txt"
     )
+
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Número de tickers a descargar en paralelo con --tickers-file (por defecto 1, secuencial)."
+    )
+    
+    parser.add_argument(
+        "--metrics",
+        type=str,
+        help="Lista separada por comas de filas de CSV_ROW_NAMES a calcular (ej: EPS,peRatio,beta). "
+             "Solo se descargan los datos que necesitan. Por defecto, todas."
+    )
+    
+    parser.add_argument(
+        "--panel",
+        action="store_true",
+        help="Con --tickers-file, calcula todo el lote de una vez como un panel numérico ticker × métrica × periodo "
+             "en lugar de ticker a ticker (misma salida)."
+    )
+    
+    parser.add_argument(
+        "--csv",
+        action="store_true",
+        help="Escribe también los CSV raw y readable de cada ticker además del .xlsx."
+    )
+    
+    parser.add_argument(
+        "--single-workbook",
+        dest="single_workbook",
+        action="store_true",
+        help="Con --tickers-file, escribe un único .xlsx por ejecución con una hoja por ticker y una hoja 'summary'."
+    )
+    
+    parser.add_argument(
+        "--parquet",
+        action="store_true",
+        help="Con --tickers-file, exporta además todo el lote como tabla larga (ticker, metric, period, value, as_of) "
+             "en Parquet particionado por fecha (PARQUET_DIRECTORY)."
+    )
+    
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Ignora la cache en disco y vuelve a descargar todos los datos (la cache se actualiza)."
+    )
+    
+    archive = parser.add_mutually_exclusive_group()
+    archive.add_argument(
+        "--record",
+        metavar="DIR",
+        help="Graba en DIR todos los datasets obtenidos de cada ticker para poder repetir la ejecución con --replay."
+    )
+    archive.add_argument(
+        "--replay",
+        metavar="DIR",
+        help="Sirve los datasets desde una grabación de --record, sin acceder a la red ni a la cache."
+    )
     
     args = parser.parse_args()
+    disk_cache.set_refresh(args.refresh)
+    if args.csv:
+        file_writer.set_write_csv(True)
+    if args.record:
+        replay.set_record(args.record)
+    elif args.replay:
+        try:
+            replay.set_replay(args.replay)
+        except FileNotFoundError as e:
+            parser.error(str(e))
+    if args.workers < 1:
+        parser.error("--workers debe ser un entero >= 1")
+    try:
+        rows = resolve_rows(args.metrics) if args.metrics else None
+    except ValueError as e:
+        parser.error(str(e))
     
     # Ejecutar el pipeline
     if args.tickers_file:
@@ -66,16 +227,19 @@ def main():
             if not tickers:
                 logging.error(f"El archivo {args.tickers_file} no contiene tickers válidos.")
                 return
-            for t in tickers:
-                run_pipeline(t)
+            run_batch(tickers, workers=args.workers, rows=rows, panel=args.panel,
+                      single_workbook=args.single_workbook or SINGLE_WORKBOOK,
+                      parquet_export=args.parquet or PARQUET_EXPORT)
         except FileNotFoundError:
             logging.error(f"Archivo de tickers no encontrado: {args.tickers_file}")
         except Exception as e:
             logging.exception(f"Error leyendo el archivo de tickers: {e}")
     elif args.ticker:
-        run_pipeline(args.ticker)
+        run_pipeline(args.ticker, rows=rows)
     else:
         logging.error("Debe pasar un ticker como argumento o usar --tickers-file <archivo> con la lista de tickers.")
+        return
+    log_run_stats()
 
 if __name__ == "__main__":
     # Esto permite que el script sea ejecutado directamente
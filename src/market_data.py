@@ -0,0 +1,250 @@
+# src/market_data.py
+
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from config import (
+    BENCHMARK_TICKER, BENCHMARK_CACHE_SECONDS, BATCH_HISTORY_CHUNK_SIZE, HISTORY_OVERLAP_DAYS, YEARS_TO_EXTRACT,
+)
+from src import disk_cache, negative_cache, replay
+from src.yahoo_client import call_yahoo, download_history, new_ticker
+
+# Cache en memoria del histórico del benchmark, compartido (solo lectura) por todos los tickers
+_benchmark_lock = threading.Lock()
+_benchmark_cache = {'hist': None, 'fetched_at': None}
+
+
+def history_window():
+    """Devuelve (inicio, fin) en formato YYYY-MM-DD para las descargas de histórico diario."""
+    hist_start = f"{min(YEARS_TO_EXTRACT)}-01-01"
+    hist_end = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
+    return hist_start, hist_end
+
+
+def to_naive_daily_index(price_hist: pd.DataFrame) -> pd.DataFrame:
+    """
+    Quita la zona horaria del índice diario conservando la fecha local del mercado,
+    para poder alinear históricos de distintas fuentes (Ticker.history vs yf.download).
+    """
+    if isinstance(price_hist, pd.DataFrame) and getattr(price_hist.index, 'tz', None) is not None:
+        return price_hist.tz_localize(None)
+    return price_hist
+
+
+def incremental_start(stored: pd.DataFrame):
+    """
+    Fecha (YYYY-MM-DD) desde la que hay que pedir barras para ampliar un histórico guardado:
+    la última barra menos HISTORY_OVERLAP_DAYS. None si no hay nada aprovechable.
+    """
+    if not isinstance(stored, pd.DataFrame) or stored.empty or 'Close' not in stored.columns:
+        return None
+    last = to_naive_daily_index(stored).index[-1]
+    return (last - timedelta(days=HISTORY_OVERLAP_DAYS)).strftime("%Y-%m-%d")
+
+
+def merge_history(stored: pd.DataFrame, fresh: pd.DataFrame):
+    """
+    Añade al histórico guardado las barras nuevas de `fresh` (que empieza dentro del solape).
+    La última barra guardada se sustituye sin compararla: si se descargó con el mercado
+    abierto su cierre era provisional. Devuelve None si hay que descargar el histórico
+    completo: sin solape, cierres revisados en el resto del solape o dividendos/splits que
+    cambian barras ya guardadas (con auto_adjust cambian los cierres anteriores); los
+    posteriores a la última barra guardada son datos nuevos, no una revisión.
+    """
+    if not isinstance(fresh, pd.DataFrame) or fresh.empty:
+        return None
+    stored = to_naive_daily_index(stored)
+    fresh = to_naive_daily_index(fresh)
+    overlap = stored.index.intersection(fresh.index)
+    if overlap.empty:
+        return None
+    checked = overlap[overlap < stored.index[-1]]
+    if not np.allclose(stored.loc[checked, 'Close'].to_numpy(dtype=float),
+                       fresh.loc[checked, 'Close'].to_numpy(dtype=float), rtol=1e-6, equal_nan=True):
+        return None
+    for col in ('Dividends', 'Stock Splits'):
+        if col not in fresh.columns:
+            continue
+        old = stored.loc[checked, col].fillna(0.0) if col in stored.columns else 0.0
+        if (fresh.loc[checked, col].fillna(0.0) != old).any():
+            return None
+    merged = pd.concat([stored[stored.index < fresh.index[0]], fresh])
+    return merged[merged.index >= pd.Timestamp(history_window()[0])]
+
+
+def load_history_incremental(symbol: str, fetch_range):
+    """
+    Devuelve el histórico diario de `symbol` pidiendo solo las barras nuevas respecto a lo
+    guardado en la cache en disco (aunque haya caducado). fetch_range(start, end) hace la
+    descarga. Si no hay nada guardado o se detecta una revisión, descarga la ventana completa.
+    """
+    hist_start, hist_end = history_window()
+    stored = disk_cache.load_stale(symbol, 'history')
+    start = incremental_start(stored)
+    if start is not None:
+        merged = merge_history(stored, fetch_range(start, hist_end))
+        if merged is not None:
+            return merged
+        logging.info(f"Histórico de {symbol} revisado (ajustes, dividendos o splits); se descarga completo.")
+    return fetch_range(hist_start, hist_end)
+
+
+def get_benchmark_history(refresh: bool = False) -> pd.DataFrame:
+    """
+    Devuelve el histórico diario del benchmark (BENCHMARK_TICKER).
+    Se descarga como mucho una vez cada BENCHMARK_CACHE_SECONDS (o se lee de la cache en
+    disco); las llamadas concurrentes esperan a la primera descarga en lugar de repetirla.
+    Devuelve None si falla.
+    """
+    with _benchmark_lock:
+        fetched_at = _benchmark_cache['fetched_at']
+        fresh = fetched_at is not None and (time.monotonic() - fetched_at) < BENCHMARK_CACHE_SECONDS
+        if fresh and not refresh:
+            return _benchmark_cache['hist']
+
+        if replay.is_replaying():
+            try:
+                market_hist = to_naive_daily_index(replay.load(BENCHMARK_TICKER, 'history'))
+            except replay.ReplayMissError as e:
+                logging.warning(str(e))
+                return None
+            _benchmark_cache['hist'] = market_hist
+            _benchmark_cache['fetched_at'] = time.monotonic()
+            return market_hist
+
+        hit, market_hist = (False, None) if refresh else disk_cache.load(BENCHMARK_TICKER, 'history')
+        if hit:
+            market_hist = to_naive_daily_index(market_hist)
+            replay.record(BENCHMARK_TICKER, 'history', market_hist)
+            _benchmark_cache['hist'] = market_hist
+            _benchmark_cache['fetched_at'] = time.monotonic()
+            return market_hist
+
+        try:
+            logging.info(f"Descargando histórico del benchmark {BENCHMARK_TICKER}...")
+            benchmark = new_ticker(BENCHMARK_TICKER)
+            market_hist = load_history_incremental(
+                BENCHMARK_TICKER,
+                lambda start, end: call_yahoo('history', benchmark.history, start=start, end=end, interval='1d'))
+            disk_cache.store(BENCHMARK_TICKER, 'history', market_hist)
+            market_hist = to_naive_daily_index(market_hist)
+            replay.record(BENCHMARK_TICKER, 'history', market_hist)
+        except Exception as e:
+            logging.warning(f"No se pudo descargar el benchmark {BENCHMARK_TICKER}: {e}")
+            # No se cachea el fallo: el siguiente ticker lo volverá a intentar
+            return None
+        _benchmark_cache['hist'] = market_hist
+        _benchmark_cache['fetched_at'] = time.monotonic()
+        return market_hist
+
+
+def _split_download(data: pd.DataFrame, symbols) -> dict:
+    """Separa el DataFrame de yf.download(group_by='ticker') en un histórico por símbolo."""
+    out = {}
+    if not isinstance(data, pd.DataFrame) or data.empty:
+        return out
+    multi = isinstance(data.columns, pd.MultiIndex)
+    for sym in symbols:
+        try:
+            if multi:
+                if sym not in data.columns.get_level_values(0):
+                    continue
+                hist = data[sym]
+            else:
+                # Con un único símbolo yf.download puede devolver columnas planas
+                hist = data
+            hist = hist.dropna(how='all')
+            if hist.empty or 'Close' not in hist.columns or hist['Close'].isna().all():
+                continue
+            # Mismo formato que Ticker.history(actions=True): acciones con 0 en los días sin evento
+            hist = hist.copy()
+            for col in ('Dividends', 'Stock Splits'):
+                hist[col] = hist[col].fillna(0.0) if col in hist.columns else 0.0
+            out[sym] = to_naive_daily_index(hist)
+        except Exception as e:
+            logging.warning(f"No se pudo separar el histórico de {sym} de la descarga agrupada: {e}")
+    return out
+
+
+def _download_chunks(symbols, start, end) -> dict:
+    """Descarga con yf.download en grupos de BATCH_HISTORY_CHUNK_SIZE y separa por símbolo."""
+    histories = {}
+    for i in range(0, len(symbols), BATCH_HISTORY_CHUNK_SIZE):
+        chunk = symbols[i:i + BATCH_HISTORY_CHUNK_SIZE]
+        logging.info(f"Descargando histórico agrupado de {len(chunk)} tickers desde {start} ({i + 1}-{i + len(chunk)} de {len(symbols)})...")
+        try:
+            data = call_yahoo('download', download_history, chunk, start=start, end=end, interval='1d',
+                              actions=True, group_by='ticker', progress=False, threads=True)
+        except Exception as e:
+            logging.warning(f"Falló la descarga agrupada de históricos: {e}")
+            continue
+        histories.update(_split_download(data, chunk))
+    return histories
+
+
+def get_batch_price_history(tickers) -> dict:
+    """
+    Descarga el histórico diario (con dividendos y splits) de todos los tickers en
+    llamadas agrupadas a yf.download de BATCH_HISTORY_CHUNK_SIZE símbolos.
+    Los históricos vigentes en la cache en disco no se vuelven a descargar y los
+    caducados solo piden las barras nuevas (ver load_history_incremental).
+    Devuelve {ticker: DataFrame}; los tickers sin datos no aparecen, de modo que
+    get_annual_fundamentals vuelve a pedirlos individualmente.
+    """
+    if replay.is_replaying():
+        return _replay_batch_history(tickers)
+    histories = {}
+    incremental = {}
+    full = []
+    for sym in dict.fromkeys(t.upper() for t in tickers):
+        if negative_cache.should_skip(sym):
+            continue
+        hit, hist = disk_cache.load(sym, 'history')
+        if hit and isinstance(hist, pd.DataFrame) and not hist.empty:
+            histories[sym] = to_naive_daily_index(hist)
+            continue
+        stored = disk_cache.load_stale(sym, 'history')
+        if incremental_start(stored) is not None:
+            incremental[sym] = stored
+        else:
+            full.append(sym)
+    hist_start, hist_end = history_window()
+
+    # Barras nuevas de los históricos guardados, desde el solape más antiguo del grupo
+    if incremental:
+        start = min(incremental_start(stored) for stored in incremental.values())
+        fresh = _download_chunks(list(incremental), start, hist_end)
+        for sym, stored in incremental.items():
+            merged = merge_history(stored, fresh.get(sym))
+            if merged is None:
+                full.append(sym)
+            else:
+                disk_cache.store(sym, 'history', merged)
+                histories[sym] = merged
+
+    downloaded = _download_chunks(full, hist_start, hist_end) if full else {}
+    for sym, hist in downloaded.items():
+        disk_cache.store(sym, 'history', hist)
+    histories.update(downloaded)
+
+    missing = len(full) - len(downloaded)
+    if missing:
+        logging.info(f"{missing} tickers sin histórico en la descarga agrupada; se pedirán individualmente.")
+    for sym, hist in histories.items():
+        replay.record(sym, 'history', hist)
+    return {t: histories[t.upper()] for t in tickers if t.upper() in histories}
+
+
+def _replay_batch_history(tickers) -> dict:
+    """get_batch_price_history con --replay: los históricos grabados de los tickers que los tengan."""
+    histories = {}
+    for t in tickers:
+        try:
+            histories[t] = to_naive_daily_index(replay.load(t, 'history'))
+        except replay.ReplayMissError:
+            continue
+    return histories
@@ -0,0 +1,463 @@
+# src/metrics.py
+
+import numpy as np
+import pandas as pd
+from config import CSV_ROW_NAMES, YEARS_TO_EXTRACT
+from src.beta import annual_betas, get_batch_betas, market_returns, panel_annual_betas, rolling_beta
+from src.market_data import to_naive_daily_index
+from src.price_summary import PriceHistorySummary, price_panel
+from src.result import actions_table, range_table, to_float
+from src.statements import (BALANCE_LABELS, INCOME_LABELS, StatementIndex, column_year,
+                            get_value_candidates, safe_get_value)
+
+# Datasets de Yahoo que pueden ser entradas de una métrica, en el orden canónico en que
+# los descarga fetch_datasets (ver fetch_engine.DATASET_FETCHERS)
+DATASETS = ('financials', 'balance_sheet', 'earnings', 'info', 'history', 'benchmark')
+# Entradas que no son datasets: las aporta el motor (símbolo del ticker)
+CONTEXT_INPUTS = ('symbol',)
+
+# Nodo -> (entradas, fórmula). Las entradas son datasets, entradas de contexto u otros
+# nodos; la fórmula recibe sus valores en ese orden. Los valores por año son arrays float64
+# con los años de YEARS_TO_EXTRACT en el último eje. Las filas de CSV_ROW_NAMES son los
+# nodos de salida: las numéricas devuelven un array por periodo (PERIODS), 52WeekRange una
+# tabla low/high y dividend_and_split la tabla de eventos (src/result.py).
+METRICS = {}
+# Nodo -> forma de panel (ver src/panel.py): la misma fórmula si es vectorizada (funciona
+# con arrays ticker × año) o una implementación propia para todo el lote (batch). Los
+# nodos sin forma de panel se calculan ticker a ticker.
+PANEL_FORMULAS = {}
+
+
+def metric(name, *inputs, vectorised=False, batch=None):
+    """
+    Decorador que registra `name` como nodo calculado a partir de `inputs`.
+    vectorised=True indica que la fórmula solo usa operaciones sobre el último eje (año),
+    así que el panel la evalúa una vez con los arrays ticker × año de todo el lote.
+    batch: fórmula alternativa para todo el lote (recibe las entradas del panel).
+    """
+    def register(formula):
+        if name in METRICS or name in DATASETS or name in CONTEXT_INPUTS:
+            raise ValueError(f"Métrica duplicada: {name}")
+        METRICS[name] = (tuple(inputs), formula)
+        if batch is not None or vectorised:
+            PANEL_FORMULAS[name] = batch if batch is not None else formula
+        return formula
+    return register
+
+
+def info_field(*fields) -> str:
+    """
+    Nodo con el valor de info (float, NaN si falta) del primer campo no vacío de `fields`
+    (como `info.get(a) or info.get(b)`); lo registra la primera vez. Devuelve su nombre.
+    """
+    name = 'info:' + '|'.join(fields)
+    if name not in METRICS:
+        def _field(info):
+            value = info.get(fields[0])
+            for field in fields[1:]:
+                value = value or info.get(field)
+            return to_float(value)
+        metric(name, 'info')(_field)
+    return name
+
+
+def safe_ratio(num, den) -> np.ndarray:
+    """num / den elemento a elemento; NaN si falta alguno de los dos o el denominador es 0."""
+    den = np.asarray(den, dtype='float64')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.asarray(num, dtype='float64') / np.where(den == 0, np.nan, den)
+
+
+def fill(values, fill_value) -> np.ndarray:
+    """`values` con los NaN sustituidos por `fill_value` (escalar o array)."""
+    return np.where(np.isnan(values), fill_value, values)
+
+
+def previous_year(values) -> np.ndarray:
+    """Valor del año anterior en cada año (el primero queda sin valor)."""
+    values = np.asarray(values, dtype='float64')
+    return np.concatenate([np.full(values.shape[:-1] + (1,), np.nan), values[..., :-1]], axis=-1)
+
+
+def year_row(values, actual=np.nan) -> np.ndarray:
+    """Fila del resultado: un valor por año de YEARS_TO_EXTRACT (NaN = sin dato) más 'actual'."""
+    values = np.asarray(values, dtype='float64')
+    actual = np.broadcast_to(np.asarray(actual, dtype='float64'), values.shape[:-1])
+    return np.concatenate([values, actual[..., None]], axis=-1)
+
+
+def _actual_only(actual) -> np.ndarray:
+    actual = np.asarray(actual, dtype='float64')
+    return year_row(np.full(actual.shape + (len(YEARS_TO_EXTRACT),), np.nan), actual)
+
+
+# --- Intermedios: estados financieros, histórico y benchmark ---
+
+@metric('income', 'financials')
+def _income(financials):
+    # Una sola pasada por el estado a una matriz float64 (métrica × año)
+    return StatementIndex(financials, INCOME_LABELS).to_matrix(YEARS_TO_EXTRACT)[0].to_numpy()
+
+
+@metric('balance_matrix', 'balance_sheet')
+def _balance_matrix(balance_sheet):
+    matrix, present = StatementIndex(balance_sheet, BALANCE_LABELS).to_matrix(YEARS_TO_EXTRACT)
+    return matrix.to_numpy(), present.to_numpy()
+
+
+@metric('balance', 'balance_matrix')
+def _balance(balance_matrix):
+    return balance_matrix[0]
+
+
+@metric('balance_years', 'balance_matrix')
+def _balance_years(balance_matrix):
+    # Años con columna en el balance
+    return balance_matrix[1]
+
+
+# Cada métrica canónica de los estados es un nodo propio (una fila de la matriz)
+for _pos, _name in enumerate(INCOME_LABELS):
+    metric(_name, 'income', vectorised=True)(lambda income, _pos=_pos: income[..., _pos, :])
+for _pos, _name in enumerate(BALANCE_LABELS):
+    metric(_name, 'balance', vectorised=True)(lambda balance, _pos=_pos: balance[..., _pos, :])
+
+
+@metric('prices', 'history',
+        batch=lambda histories: price_panel([to_naive_daily_index(h) for h in histories], YEARS_TO_EXTRACT))
+def _prices(history):
+    # Agregados anuales del histórico (cierre, rango, dividendos, splits, rendimientos) en una pasada
+    return PriceHistorySummary(history)
+
+
+@metric('year_close', 'prices', batch=lambda prices: prices['close'])
+def _year_close(prices):
+    # Cierre del último día con datos hasta el final de cada año
+    return np.array([to_float(prices.year_end_close(year)) for year in YEARS_TO_EXTRACT])
+
+
+@metric('year_low', 'prices', batch=lambda prices: np.where(prices['has_range'][:, None], prices['low'], np.nan))
+def _year_low(prices):
+    return np.array([to_float(prices.low(year)) if prices.has_range else np.nan for year in YEARS_TO_EXTRACT])
+
+
+@metric('year_high', 'prices', batch=lambda prices: np.where(prices['has_range'][:, None], prices['high'], np.nan))
+def _year_high(prices):
+    return np.array([to_float(prices.high(year)) if prices.has_range else np.nan for year in YEARS_TO_EXTRACT])
+
+
+@metric('year_dividends', 'prices', batch=lambda prices: prices['dividends'])
+def _year_dividends(prices):
+    # Suma de dividendos del año (0 si no hubo); NaN sin columna de dividendos o sin barras ese año
+    return np.array([to_float(prices.dividends(year)) for year in YEARS_TO_EXTRACT])
+
+
+@metric('year_splits', 'prices',
+        batch=lambda prices: [{year: prices['splits'].get((t, year), []) for year in YEARS_TO_EXTRACT}
+                              for t in range(len(prices['has_range']))])
+def _year_splits(prices):
+    # {año: factores de split como texto}
+    return {year: prices.splits(year) for year in YEARS_TO_EXTRACT}
+
+
+def _batch_annual_beta(symbols, histories, benchmarks, prices):
+    benchmarks = [to_naive_daily_index(bench) if isinstance(hist, pd.DataFrame) else None
+                  for hist, bench in zip(histories, benchmarks)]
+    return panel_annual_betas(prices, benchmarks, len(symbols), YEARS_TO_EXTRACT)
+
+
+@metric('annual_beta', 'symbol', 'history', 'benchmark', 'prices', batch=_batch_annual_beta)
+def _annual_beta(symbol, history, benchmark, prices):
+    # Todas las betas anuales de una vez (ver src/beta.py); en run_batch ya vienen calculadas para el lote
+    beta_data = {}
+    if isinstance(history, pd.DataFrame) and isinstance(benchmark, pd.DataFrame):
+        annual = get_batch_betas(symbol, history, benchmark)
+        if annual is None:
+            annual = annual_betas(prices.returns, market_returns(benchmark), YEARS_TO_EXTRACT)
+        beta_data.update(annual)
+    return np.array([to_float(beta_data.get(year)) for year in YEARS_TO_EXTRACT])
+
+
+@metric('rolling_beta', 'history', 'benchmark', 'prices')
+def _rolling_beta(history, benchmark, prices):
+    # Serie diaria de la beta móvil (BETA_ROLLING_WINDOW días) sobre los mismos rendimientos que annual_beta
+    if not isinstance(history, pd.DataFrame) or not isinstance(benchmark, pd.DataFrame):
+        return pd.Series(dtype=float)
+    return rolling_beta(prices.returns, market_returns(benchmark))
+
+
+@metric('eps', 'earnings', 'financials')
+def _eps(earnings_history, income_statement):
+    eps_data = {}
+    if isinstance(earnings_history, pd.DataFrame):
+        # Some yfinance DataFrames expose EPS as rows with date columns (income_stmt)
+        # but others (earnings_history) have different shapes. Detect columns as dates.
+        first_col = earnings_history.columns[0] if len(earnings_history.columns) > 0 else None
+        if column_year(first_col) is not None:
+            # columns are dates
+            for date in earnings_history.columns:
+                year = column_year(date)
+                if year in YEARS_TO_EXTRACT:
+                    eps = None
+                    for cand in ['Basic EPS', 'Diluted EPS', 'EPS', 'Earnings Per Share', 'basicEPS', 'dilutedEPS']:
+                        eps = safe_get_value(earnings_history, cand, date)
+                        if eps is not None:
+                            break
+                    eps_data[year] = eps
+        elif isinstance(income_statement, pd.DataFrame):
+            # Use the income statement (ticker.financials == ticker.income_stmt) for EPS per year
+            for date in income_statement.columns:
+                year = column_year(date)
+                if year in YEARS_TO_EXTRACT:
+                    eps = None
+                    for cand in ['Basic EPS', 'Diluted EPS', 'DilutedEPS', 'BasicEPS']:
+                        eps = get_value_candidates(income_statement, [cand], date)
+                        if eps is not None:
+                            break
+                    eps_data[year] = eps
+    return np.array([to_float(eps_data.get(year)) for year in YEARS_TO_EXTRACT])
+
+
+@metric('forward_dividend_yield', 'info')
+def _forward_dividend_yield_value(info):
+    current_price = info.get('regularMarketPrice')
+    forward_dividend = info.get('forwardDividendYield') or info.get('dividendRate')
+    return to_float(forward_dividend / current_price if forward_dividend and current_price else None)
+
+
+# --- Representative values ---
+
+@metric('marketCap', 'year_close', info_field('sharesOutstanding'), info_field('marketCap'), vectorised=True)
+def _market_cap(year_close, shares_outstanding, actual):
+    # sharesOutstanding * precio de fin de año
+    shares = np.asarray(shares_outstanding)[..., None]
+    valid = ~np.isnan(shares) & (shares != 0) & (year_close != 0)
+    return year_row(np.where(valid, shares * year_close, np.nan), actual)
+
+
+@metric('beta', 'annual_beta', info_field('beta'), vectorised=True)
+def _beta(annual_beta, actual):
+    return year_row(annual_beta, actual)
+
+
+@metric('peRatio', info_field('trailingPE'), vectorised=True)
+def _pe_ratio(trailing_pe):
+    return _actual_only(trailing_pe)
+
+
+@metric('forwardDividendYield', 'forward_dividend_yield', vectorised=True)
+def _forward_dividend_yield(forward_dividend_yield):
+    return _actual_only(forward_dividend_yield)
+
+
+@metric('EPS', 'eps', info_field('trailingEps'), vectorised=True)
+def _eps_row(eps, actual):
+    return year_row(eps, actual)
+
+
+@metric('52WeekRange', 'year_low', 'year_high', 'info')
+def _week_range(year_low, year_high, info):
+    # Mínimo y máximo de cada año; en 'actual', el rango de 52 semanas de info
+    has_both = ~np.isnan(year_low) & ~np.isnan(year_high)
+    f52_low = info.get('fiftyTwoWeekLow')
+    f52_high = info.get('fiftyTwoWeekHigh')
+    has_52 = bool(f52_low and f52_high)
+    return range_table([*np.where(has_both, year_low, np.nan), to_float(f52_low) if has_52 else np.nan],
+                       [*np.where(has_both, year_high, np.nan), to_float(f52_high) if has_52 else np.nan])
+
+
+@metric('trailingPE', info_field('trailingPE'), vectorised=True)
+def _trailing_pe(trailing_pe):
+    return _actual_only(trailing_pe)
+
+
+@metric('forwardPE', info_field('forwardPE'), vectorised=True)
+def _forward_pe(forward_pe):
+    return _actual_only(forward_pe)
+
+
+@metric('profitMargin', 'net_income_direct', 'total_revenue', info_field('profitMargins'), vectorised=True)
+def _profit_margin(net_income_direct, total_revenue, actual):
+    return year_row(safe_ratio(net_income_direct, total_revenue), actual)
+
+
+@metric('dividend_and_split', 'year_dividends', 'year_splits', 'info')
+def _dividend_and_split(year_dividends, year_splits, info):
+    # Eventos: suma de dividendos de cada año con barras (si no es 0) y cada factor de split
+    events = []
+    for year, total_div in zip(YEARS_TO_EXTRACT, year_dividends):
+        if np.isnan(total_div):
+            continue
+        if total_div != 0:
+            events.append((year, 'dividend', float(total_div), None))
+        events.extend((year, 'split', np.nan, factor) for factor in year_splits[year])
+    last_div = info.get('lastDividendValue') or info.get('dividendRate') or info.get('forwardDividendYield')
+    last_split = info.get('lastSplitFactor') or info.get('lastSplitDate')
+    if last_div is not None:
+        events.append(('actual', 'dividend', to_float(last_div), None))
+    if last_split is not None:
+        events.append(('actual', 'split', np.nan, str(last_split)))
+    return actions_table(events)
+
+
+@metric('payoutRatio', 'eps', 'year_dividends', info_field('payoutRatio'), vectorised=True)
+def _payout_ratio(eps, year_dividends, actual):
+    # (annual dividends per share) / EPS por año
+    return year_row(safe_ratio(year_dividends, eps), actual)
+
+
+@metric('ROE', 'net_income_direct', 'total_equity', info_field('returnOnEquity'), vectorised=True)
+def _roe(net_income_direct, total_equity, actual):
+    return year_row(safe_ratio(net_income_direct, total_equity), actual)
+
+
+# --- Financials subsection ---
+
+@metric('totalRevenue', 'total_revenue', info_field('totalRevenue'), vectorised=True)
+def _total_revenue(total_revenue, actual):
+    return year_row(total_revenue, actual)
+
+
+@metric('totalRevenueChange', 'total_revenue', vectorised=True)
+def _total_revenue_change(total_revenue):
+    return year_row(safe_ratio(total_revenue, previous_year(total_revenue)) - 1.0)
+
+
+@metric('costOfRevenue', 'cost_of_revenue', vectorised=True)
+def _cost_of_revenue(cost_of_revenue):
+    return year_row(cost_of_revenue)
+
+
+@metric('operatingExpense', 'operating_expense', info_field('operatingMargins'), vectorised=True)
+def _operating_expense(operating_expense, actual):
+    return year_row(operating_expense, actual)
+
+
+@metric('netIncome', 'net_income', info_field('netIncomeToCommon', 'netIncome'), vectorised=True)
+def _net_income(net_income, actual):
+    return year_row(net_income, actual)
+
+
+@metric('EBITDA', 'ebitda', info_field('EBITDA'), vectorised=True)
+def _ebitda(ebitda, actual):
+    return year_row(ebitda, actual)
+
+
+# --- Balance sheets subsection (solo los años con columna en el balance) ---
+
+@metric('cash cash equivalence', 'cash', vectorised=True)
+def _cash(cash):
+    return year_row(cash)
+
+
+@metric('total assets', 'total_assets', vectorised=True)
+def _total_assets(total_assets):
+    return year_row(total_assets)
+
+
+@metric('total liabilities', 'total_liabilities', vectorised=True)
+def _total_liabilities(total_liabilities):
+    return year_row(total_liabilities)
+
+
+@metric('working capital', 'working_capital', vectorised=True)
+def _working_capital(working_capital):
+    return year_row(working_capital)
+
+
+@metric('invested capital', 'total_assets', 'total_current_liabilities', 'total_liabilities', 'cash', vectorised=True)
+def _invested_capital(total_assets, total_current_liabilities, total_liabilities, cash):
+    # simple proxy = total assets - total current liabilities - cash
+    used_liab = fill(fill(total_current_liabilities, total_liabilities), 0.0)
+    return year_row(total_assets - used_liab - fill(cash, 0.0))
+
+
+@metric('net debts', 'net_debt', vectorised=True)
+def _net_debts(net_debt):
+    return year_row(net_debt)
+
+
+@metric('net debts over EBITDA', 'net_debt', 'ebitda', 'balance_years', vectorised=True)
+def _net_debts_over_ebitda(net_debt, ebitda, balance_years):
+    # Sin valor 'actual' a propósito: la deuda neta solo sale del balance anual y mezclarla
+    # con cifras TTM de info daría un ratio que no es comparable con los de cada año
+    return year_row(np.where(balance_years, safe_ratio(net_debt, ebitda), np.nan))
+
+
+@metric('ordinary shared number', 'ordinary_shares', 'balance_years', info_field('sharesOutstanding'), vectorised=True)
+def _ordinary_shares(ordinary_shares, balance_years, actual):
+    # ordinary shares may be in income_statement/financials as 'Basic Average Shares' etc.
+    return year_row(np.where(balance_years, ordinary_shares, np.nan), actual)
+
+
+@metric('net tangible assets', 'total_assets', 'intangible_assets', 'goodwill', vectorised=True)
+def _net_tangible_assets(total_assets, intangible_assets, goodwill):
+    return year_row(total_assets - fill(intangible_assets, 0.0) - fill(goodwill, 0.0))
+
+
+def evaluation_order(names, known=()) -> list:
+    """
+    Nodos a calcular para obtener `names`, en orden topológico (cada nodo después de sus
+    entradas; los datasets y entradas de contexto incluidos). Solo aparece lo necesario:
+    los nodos de `known` (ya calculados) no se recorren ni aparecen.
+    Lanza ValueError si algún nombre no existe o hay un ciclo.
+    """
+    order, done, visiting = [], set(), set()
+
+    def visit(name, path):
+        if name in done or name in known:
+            return
+        if name in visiting:
+            raise ValueError(f"Ciclo en las métricas: {' -> '.join(path + [name])}")
+        if name not in METRICS and name not in DATASETS and name not in CONTEXT_INPUTS:
+            raise ValueError(f"Métrica o entrada desconocida: {name}" + (f" (usada por {path[-1]})" if path else ""))
+        visiting.add(name)
+        for dep in METRICS.get(name, ((), None))[0]:
+            visit(dep, path + [name])
+        visiting.discard(name)
+        done.add(name)
+        order.append(name)
+
+    for name in names:
+        visit(name, [])
+    return order
+
+
+def required_datasets(names) -> set:
+    """Datasets de Yahoo de los que dependen (directa o indirectamente) los nodos `names`."""
+    return {name for name in evaluation_order(names) if name in DATASETS}
+
+
+class MetricEngine:
+    """
+    Evalúa nodos del registro para un ticker a partir de sus datasets (ver fetch_raw_data),
+    en orden topológico y solo los necesarios para lo pedido. Cada nodo se calcula una
+    sola vez y se memoriza, de modo que los intermedios compartidos (matrices de los
+    estados, netIncome, EBITDA, agregados del histórico...) se reutilizan entre filas.
+    Los datasets ausentes de `raw` cuentan como None.
+    """
+
+    def __init__(self, ticker_symbol: str, raw: dict):
+        self._raw = raw
+        self._values = {'symbol': ticker_symbol}
+
+    def seed(self, name, value):
+        """Fija el valor de un nodo ya calculado fuera (p. ej. por el panel para todo el lote)."""
+        self._values[name] = value
+
+    def evaluate(self, names) -> dict:
+        """{nombre: valor} de los nodos pedidos."""
+        names = list(names)
+        for name in evaluation_order(names, known=self._values):
+            if name in DATASETS:
+                value = self._raw.get(name)
+                # info ausente o vacío cuenta como diccionario vacío
+                self._values[name] = (value or {}) if name == 'info' else value
+            else:
+                inputs, formula = METRICS[name]
+                self._values[name] = formula(*(self._values[dep] for dep in inputs))
+        return {name: self._values[name] for name in names}
+
+
+# Todas las filas del CSV deben estar registradas y el grafo no puede tener ciclos
+evaluation_order(CSV_ROW_NAMES)
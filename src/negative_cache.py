@@ -0,0 +1,108 @@
+# src/negative_cache.py
+
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+
+from yfinance.exceptions import YFPricesMissingError, YFTickerMissingError, YFTzMissingError
+from config import (
+    CACHE_DIRECTORY, NEGATIVE_CACHE_ENABLED, NEGATIVE_CACHE_TTL_SECONDS, NEGATIVE_CACHE_MAX_SECONDS,
+)
+from src import disk_cache, replay
+
+_PATH = os.path.join(CACHE_DIRECTORY, 'negative_cache.json')
+_lock = threading.Lock()
+_entries = None
+
+
+class KnownBadTickerError(Exception):
+    """El ticker está en la cache negativa y no se ha descargado."""
+
+
+def failure_kind(exc):
+    """Tipo de fallo permanente ('missing') de una excepción de yfinance, o None si no lo es."""
+    if isinstance(exc, (YFTickerMissingError, YFTzMissingError, YFPricesMissingError)):
+        return 'missing'
+    return None
+
+
+def _load():
+    global _entries
+    if _entries is None:
+        try:
+            with open(_PATH, 'r', encoding='utf-8') as f:
+                _entries = json.load(f)
+        except FileNotFoundError:
+            _entries = {}
+        except Exception as e:
+            logging.warning(f"Cache negativa ilegible ({_PATH}): {e}")
+            _entries = {}
+    return _entries
+
+
+def _save():
+    os.makedirs(os.path.dirname(_PATH), exist_ok=True)
+    tmp_path = f"{_PATH}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(_entries, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, _PATH)
+
+
+def _active() -> bool:
+    # Con --replay la ejecución no debe depender (ni modificar) del estado de la red
+    return NEGATIVE_CACHE_ENABLED and not replay.is_replaying()
+
+
+def get_entry(symbol: str):
+    """Entrada de la cache negativa del símbolo ({'kind', 'strikes', 'recorded_at', 'retry_after'}) o None."""
+    if not _active():
+        return None
+    with _lock:
+        entry = _load().get(symbol.upper())
+        return dict(entry) if entry else None
+
+
+def should_skip(symbol: str) -> bool:
+    """True si el símbolo es conocido como inválido y aún no toca volver a comprobarlo."""
+    if disk_cache.is_refresh():
+        return False
+    entry = get_entry(symbol)
+    return entry is not None and datetime.now() < datetime.fromisoformat(entry['retry_after'])
+
+
+def record(symbol: str, kind: str):
+    """Registra (o renueva, con espera doble) un fallo permanente del símbolo."""
+    if not _active():
+        return
+    symbol = symbol.upper()
+    now = datetime.now()
+    with _lock:
+        entries = _load()
+        strikes = entries.get(symbol, {}).get('strikes', 0) + 1
+        wait = min(NEGATIVE_CACHE_TTL_SECONDS.get(kind, 0) * 2 ** (strikes - 1), NEGATIVE_CACHE_MAX_SECONDS)
+        entries[symbol] = {
+            'kind': kind,
+            'strikes': strikes,
+            'recorded_at': now.isoformat(timespec='seconds'),
+            'retry_after': (now + timedelta(seconds=wait)).isoformat(timespec='seconds'),
+        }
+        try:
+            _save()
+        except Exception as e:
+            logging.warning(f"No se pudo guardar la cache negativa: {e}")
+    logging.info(f"{symbol} registrado en la cache negativa ({kind}) hasta {entries[symbol]['retry_after']}.")
+
+
+def clear(symbol: str):
+    """Quita el símbolo de la cache negativa (vuelve a tener datos)."""
+    if not _active():
+        return
+    with _lock:
+        entries = _load()
+        if entries.pop(symbol.upper(), None) is not None:
+            try:
+                _save()
+            except Exception as e:
+                logging.warning(f"No se pudo guardar la cache negativa: {e}")
@@ -0,0 +1,105 @@
+# src/panel.py
+
+import logging
+
+import numpy as np
+import pandas as pd
+from config import CSV_ROW_NAMES
+from src.data_fetcher import missing_core_data
+from src.metrics import METRICS, PANEL_FORMULAS, MetricEngine, evaluation_order
+from src.result import ACTIONS_ROW, PERIODS, RANGE_ROW, TEXT_ROWS, FundamentalsResult
+
+
+class FundamentalsPanel:
+    """
+    Resultados de un lote de tickers como un único panel numérico ticker × métrica × periodo
+    (float64; NaN = sin dato), con los periodos de PERIODS. Los rangos y los eventos
+    corporativos (TEXT_ROWS) se guardan como una tabla por ticker. to_result() devuelve el
+    resultado de un ticker igual que compute_fundamentals.
+    """
+
+    def __init__(self, tickers, rows, metrics, values, tables, infos):
+        self.tickers = list(tickers)
+        self.rows = list(rows)
+        self.metrics = list(metrics)
+        self.values = values
+        self._position = {symbol: t for t, symbol in enumerate(self.tickers)}
+        self._metric_pos = {metric: k for k, metric in enumerate(self.metrics)}
+        self._tables = tables
+        self._infos = infos
+
+    def frame(self, metric) -> pd.DataFrame:
+        """Una métrica para todos los tickers: DataFrame ticker × periodo."""
+        return pd.DataFrame(self.values[:, self._metric_pos[metric], :], index=self.tickers, columns=PERIODS)
+
+    def ticker_frame(self, symbol) -> pd.DataFrame:
+        """Todas las métricas numéricas de un ticker: DataFrame métrica × periodo."""
+        return pd.DataFrame(self.values[self._position[symbol]], index=self.metrics, columns=PERIODS)
+
+    def to_result(self, symbol):
+        """(result, red_cells, green_cells) de un ticker, como compute_fundamentals (FundamentalsResult)."""
+        t = self._position.get(symbol)
+        if t is None:
+            logging.error(f"Datos históricos incompletos para {symbol}.")
+            return None, None, None
+        values = pd.DataFrame(self.values[t], index=self.metrics, columns=PERIODS)
+        result = FundamentalsResult(
+            symbol, self.rows, values,
+            ranges=self._tables[RANGE_ROW][t] if RANGE_ROW in self._tables else None,
+            actions=self._tables[ACTIONS_ROW][t] if ACTIONS_ROW in self._tables else None,
+            price=self._infos[t].get('regularMarketPrice'))
+        return result, [], []
+
+
+def compute_panel(raws: dict, rows=None) -> FundamentalsPanel:
+    """
+    Calcula las filas `rows` (por defecto CSV_ROW_NAMES) de todos los tickers de `raws`
+    ({símbolo: datasets de fetch_raw_data}) como un solo panel, recorriendo el registro de
+    src/metrics.py en orden topológico. Los nodos con forma de panel (PANEL_FORMULAS) se
+    calculan una vez para todo el lote: las fórmulas vectorizadas con las entradas apiladas
+    (arrays ticker × año) y las de lote con sus propias entradas. El resto, ticker a ticker
+    con MetricEngine, a partir de lo ya calculado para el lote.
+    Los tickers sin datos (raw None o sin estados ni histórico) quedan fuera del panel.
+    """
+    rows = list(CSV_ROW_NAMES) if rows is None else list(rows)
+    order = evaluation_order(rows)
+    tickers = [symbol for symbol, raw in raws.items() if raw is not None and not missing_core_data(raw)]
+    engines = [MetricEngine(symbol, raws[symbol]) for symbol in tickers]
+
+    # Nodo -> valor para todo el lote: array con los tickers en el primer eje, lista por
+    # ticker o lo que devuelva la fórmula de lote. `batch` son los calculados como panel.
+    computed, batch = {}, set()
+
+    def stacked(name) -> np.ndarray:
+        # Los valores por ticker se apilan una sola vez, aunque los usen varias fórmulas
+        if not isinstance(computed[name], np.ndarray):
+            computed[name] = np.stack([np.asarray(value) for value in computed[name]])
+        return computed[name]
+
+    for name in order if tickers else []:
+        inputs, formula = METRICS.get(name, ((), None))
+        panel_formula = PANEL_FORMULAS.get(name)
+        if formula is None:
+            # Datasets y entradas de contexto: una lista por ticker
+            computed[name] = [engine.evaluate([name])[name] for engine in engines]
+            batch.add(name)
+        elif panel_formula is formula:
+            computed[name] = formula(*(stacked(dep) for dep in inputs))
+            batch.add(name)
+        elif panel_formula is not None and all(dep in batch for dep in inputs):
+            computed[name] = panel_formula(*(computed[dep] for dep in inputs))
+            batch.add(name)
+        else:
+            for t, engine in enumerate(engines):
+                for dep in inputs:
+                    if dep in batch and isinstance(computed[dep], (np.ndarray, list)):
+                        engine.seed(dep, computed[dep][t])
+            computed[name] = [engine.evaluate([name])[name] for engine in engines]
+
+    metrics = [row for row in rows if row not in TEXT_ROWS]
+    values = np.full((len(tickers), len(metrics), len(PERIODS)), np.nan)
+    for k, row in enumerate(metrics if tickers else []):
+        values[:, k, :] = stacked(row)
+    tables = {row: computed.get(row, []) for row in rows if row in TEXT_ROWS}
+    infos = [engine.evaluate(['info'])['info'] for engine in engines]
+    return FundamentalsPanel(tickers, rows, metrics, values, tables, infos)
@@ -0,0 +1,175 @@
+# src/pipeline.py
+
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from config import PIPELINE_COMPUTE_WORKERS, PIPELINE_WRITER_WORKERS, PIPELINE_QUEUE_SIZE
+from src.data_fetcher import fetch_raw_data, compute_fundamentals
+from src.fetch_engine import has_partial_results
+from src.file_writer import save_result, skip_batch_result
+from src.negative_cache import KnownBadTickerError
+from src.panel import compute_panel
+from src.replay import ReplayMissError
+from src.utils import capture_logs, replay_logs
+
+# Marca de fin de trabajo que cada etapa propaga a la siguiente
+_DONE = object()
+
+
+def write_ticker(ticker: str, result) -> bool:
+    """
+    Registra y guarda el resultado de un ticker. Devuelve True si se generó la salida.
+    """
+    data, red_cells, green_cells = result if result is not None else (None, None, None)
+    if data is not None and not data.empty:
+        logging.info(f"Datos fundamentales extraídos: {data.header()}")
+        # Imprime el resultado como un string limpio
+        logging.info("\n" + data.to_frame().to_string())
+
+        if save_result(data, ticker, red_cells=red_cells, green_cells=green_cells) is not None:
+            logging.info(f"Proceso completado para {ticker.upper()}.")
+            return True
+    else:
+        logging.warning(f"No se generó ningún archivo de salida para {ticker.upper()} debido a errores previos.")
+    if not has_partial_results(ticker.upper()):
+        # No habrá reintento: las salidas del lote en orden dejan de esperar a este ticker
+        skip_batch_result(ticker)
+    return False
+
+
+def _fetch_stage(ticker, market_hist, price_hist, rows):
+    logging.info(f"Iniciando proceso para el ticker: {ticker.upper()}...")
+    try:
+        return fetch_raw_data(ticker, market_hist=market_hist, price_hist=price_hist, rows=rows)
+    except (KnownBadTickerError, ReplayMissError) as e:
+        logging.warning(str(e))
+        return None
+    except Exception as e:
+        logging.exception(f"Ocurrió un error inesperado al obtener datos para {ticker}: {e}")
+        return None
+
+
+def _compute_stage(ticker, raw, rows):
+    return compute_fundamentals(ticker, raw, rows=rows) if raw is not None else None
+
+
+def _start_stage(name, n_workers, in_q, out_q, fn, logs):
+    """
+    Arranca n_workers hilos que leen (i, ticker, dato) de in_q, aplican fn(ticker, dato)
+    capturando los logs en logs[i] y dejan (i, ticker, resultado) en out_q. out_q es
+    acotada: si la etapa siguiente va lenta, esta se bloquea (backpressure).
+    """
+    remaining = [n_workers]
+    lock = threading.Lock()
+
+    def _worker():
+        while True:
+            item = in_q.get()
+            if item is _DONE:
+                with lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last:
+                    out_q.put(_DONE)
+                else:
+                    # Reenviar la marca a los demás hilos de esta etapa
+                    in_q.put(_DONE)
+                return
+            i, ticker, data = item
+            with capture_logs(logs[i]):
+                try:
+                    result = fn(ticker, data)
+                except Exception as e:
+                    logging.exception(f"Error inesperado en la etapa '{name}' para {ticker.upper()}: {e}")
+                    result = None
+            out_q.put((i, ticker, result))
+
+    threads = [threading.Thread(target=_worker, name=f"pipeline-{name}-{k}", daemon=True) for k in range(n_workers)]
+    for t in threads:
+        t.start()
+    return threads
+
+
+def run_staged_pipeline(tickers, fetch_workers, market_hist=None, price_hists=None, rows=None,
+                        compute_workers=PIPELINE_COMPUTE_WORKERS, writer_workers=PIPELINE_WRITER_WORKERS,
+                        queue_size=PIPELINE_QUEUE_SIZE):
+    """
+    Procesa los tickers en tres etapas concurrentes conectadas por colas acotadas:
+    descarga (red) -> cálculo (CPU) -> escritura (disco). Cada etapa tiene sus propios
+    hilos, así que el lote tarda aproximadamente lo que su etapa más lenta.
+    Los logs de cada ticker se emiten completos y en el orden de `tickers`.
+    rows: subconjunto de CSV_ROW_NAMES a calcular (ver fetch_raw_data).
+    Devuelve la lista de tickers que fallaron, en orden.
+    """
+    price_hists = price_hists or {}
+    logs = [[] for _ in tickers]
+    done = [threading.Event() for _ in tickers]
+    ok = [False] * len(tickers)
+
+    input_q = queue.Queue()
+    raw_q = queue.Queue(maxsize=queue_size)
+    result_q = queue.Queue(maxsize=queue_size)
+    finished_q = queue.Queue()
+
+    _start_stage('fetch', fetch_workers, input_q, raw_q,
+                 lambda t, _: _fetch_stage(t, market_hist, price_hists.get(t), rows), logs)
+    _start_stage('compute', compute_workers, raw_q, result_q, lambda t, raw: _compute_stage(t, raw, rows), logs)
+    _start_stage('write', writer_workers, result_q, finished_q, write_ticker, logs)
+
+    def _collect():
+        while True:
+            item = finished_q.get()
+            if item is _DONE:
+                return
+            i, _, written = item
+            ok[i] = bool(written)
+            done[i].set()
+    collector = threading.Thread(target=_collect, name="pipeline-collect", daemon=True)
+    collector.start()
+
+    for i, t in enumerate(tickers):
+        input_q.put((i, t, None))
+    input_q.put(_DONE)
+
+    # Emitir los logs en el orden del archivo conforme cada ticker termina
+    for i in range(len(tickers)):
+        done[i].wait()
+        replay_logs(logs[i])
+    collector.join()
+    return [t for t, written in zip(tickers, ok) if not written]
+
+
+def run_panel_batch(tickers, fetch_workers, market_hist=None, price_hists=None, rows=None):
+    """
+    Variante por lotes del pipeline: descarga todos los tickers (fetch_workers a la vez),
+    calcula el lote completo como un único panel ticker × métrica × periodo (ver
+    src/panel.py) y escribe cada ticker con el formato de siempre.
+    Los logs de cada ticker se emiten completos y en el orden de `tickers`.
+    Devuelve la lista de tickers que fallaron, en orden.
+    """
+    price_hists = price_hists or {}
+    logs = [[] for _ in tickers]
+
+    def _fetch(i, ticker):
+        with capture_logs(logs[i]):
+            return _fetch_stage(ticker, market_hist, price_hists.get(ticker), rows)
+
+    with ThreadPoolExecutor(max_workers=fetch_workers, thread_name_prefix='panel-fetch') as pool:
+        raws = list(pool.map(_fetch, range(len(tickers)), tickers))
+    try:
+        panel = compute_panel(dict(zip(tickers, raws)), rows=rows)
+    except Exception as e:
+        logging.exception(f"Error inesperado al calcular el panel del lote: {e}")
+        panel = None
+
+    failed = []
+    for i, ticker in enumerate(tickers):
+        with capture_logs(logs[i]):
+            result = panel.to_result(ticker) if panel is not None and raws[i] is not None else None
+            written = write_ticker(ticker, result)
+        replay_logs(logs[i])
+        if not written:
+            failed.append(ticker)
+    return failed
@@ -0,0 +1,172 @@
+# src/price_summary.py
+
+import numpy as np
+import pandas as pd
+
+
+class PriceHistorySummary:
+    """
+    Agregados anuales de un histórico diario calculados en una sola pasada agrupada por
+    año: cierre del último día, máximo/mínimo, suma de dividendos, splits y rendimientos
+    diarios (reiniciados en cada año, como un pct_change por año). Las secciones de
+    compute_fundamentals leen de aquí en lugar de volver a filtrar el histórico por año.
+    """
+
+    def __init__(self, price_hist):
+        hist = price_hist if isinstance(price_hist, pd.DataFrame) else pd.DataFrame()
+        if not hist.index.is_monotonic_increasing:
+            hist = hist.sort_index(kind='stable')
+        self._years = []
+        self._year_pos = {}
+        self._last_close = None
+        self._by_year = pd.DataFrame()
+        self._splits = {}
+        self.returns = pd.Series(dtype=float)
+        self._returns_by_year = {}
+        if hist.empty or not isinstance(hist.index, pd.DatetimeIndex):
+            return
+
+        year_of_row = hist.index.year.to_numpy()
+        # Filas ordenadas: cada año es un bloque contiguo [first, last]
+        starts = np.flatnonzero(np.r_[True, year_of_row[1:] != year_of_row[:-1]])
+        ends = np.r_[starts[1:] - 1, len(hist) - 1]
+        self._years = year_of_row[starts].tolist()
+        self._year_pos = {year: i for i, year in enumerate(self._years)}
+
+        agg = {}
+        if 'Close' in hist.columns:
+            close = hist['Close']
+            self._last_close = close.to_numpy()[ends]
+            # Rendimiento diario sin cruzar años: el primer día de cada año no tiene rendimiento
+            returns = close.pct_change()
+            returns.iloc[starts] = np.nan
+            self.returns = returns.dropna()
+            self._returns_by_year = dict(iter(self.returns.groupby(self.returns.index.year)))
+        grouped = hist.groupby(year_of_row, sort=True)
+        for col, how in (('High', 'max'), ('Low', 'min'), ('Dividends', 'sum')):
+            if col in hist.columns:
+                agg[col] = getattr(grouped[col], how)()
+        self._by_year = pd.DataFrame(agg)
+        if 'Stock Splits' in hist.columns:
+            splits = hist['Stock Splits']
+            events = splits[splits != 0]
+            # str() por valor: con pandas 3 astype(str) deja los NaN como float
+            self._splits = {year: [str(v) for v in group] for year, group in events.groupby(events.index.year)}
+
+    def has_year(self, year) -> bool:
+        """Indica si el histórico tiene alguna barra en el año."""
+        return year in self._year_pos
+
+    def year_end_close(self, year):
+        """Cierre del último día con datos hasta el 31/12 del año (None si no hay barras anteriores)."""
+        if self._last_close is None or not self._years:
+            return None
+        i = int(np.searchsorted(self._years, year, side='right')) - 1
+        return None if i < 0 else self._last_close[i]
+
+    def _value(self, col, year):
+        if col not in self._by_year.columns or year not in self._year_pos:
+            return None
+        return self._by_year.at[year, col]
+
+    def high(self, year):
+        return self._value('High', year)
+
+    def low(self, year):
+        return self._value('Low', year)
+
+    def dividends(self, year):
+        """Suma de dividendos del año (0.0 si no hubo), o None si no hay barras ese año."""
+        return self._value('Dividends', year)
+
+    def splits(self, year) -> list:
+        """Factores de split del año como texto (lista vacía si no hubo)."""
+        return self._splits.get(year, [])
+
+    def returns_for(self, year) -> pd.Series:
+        """Rendimientos diarios del año (vacío si no hay barras ese año)."""
+        return self._returns_by_year.get(year, self.returns.iloc[:0])
+
+    @property
+    def has_dividends(self) -> bool:
+        return 'Dividends' in self._by_year.columns
+
+    @property
+    def has_range(self) -> bool:
+        return 'High' in self._by_year.columns and 'Low' in self._by_year.columns
+
+
+def price_panel(hists, years) -> dict:
+    """
+    Agregados anuales de los históricos de todos los tickers con una sola pasada sobre
+    sus barras concatenadas (bloques contiguos ticker × año): cierre de fin de año
+    (arrastrado a años sin barras), máximo, mínimo, dividendos, splits y rendimientos
+    diarios reiniciados en cada año, con la misma semántica que PriceHistorySummary.
+    Devuelve arrays ticker × año (por ticker en has_range / has_dividends). Los históricos
+    deben venir sin zona horaria (ver market_data.to_naive_daily_index).
+    """
+    n_tickers, years_arr = len(hists), np.asarray(years)
+    shape = (n_tickers, len(years_arr))
+    out = {name: np.full(shape, np.nan) for name in ('close', 'high', 'low', 'dividends')}
+    out['has_bars'] = np.zeros(shape, dtype=bool)
+    out['has_range'] = np.zeros(n_tickers, dtype=bool)
+    out['has_dividends'] = np.zeros(n_tickers, dtype=bool)
+    out['splits'] = {}
+    out['returns'] = (np.empty(0, dtype=int), np.empty(0, dtype='datetime64[ns]'), np.empty(0))
+
+    parts = []
+    for t, hist in enumerate(hists):
+        if not isinstance(hist, pd.DataFrame) or hist.empty or not isinstance(hist.index, pd.DatetimeIndex):
+            continue
+        if not hist.index.is_monotonic_increasing:
+            hist = hist.sort_index(kind='stable')
+        parts.append((t, hist))
+        out['has_range'][t] = 'High' in hist.columns and 'Low' in hist.columns
+        out['has_dividends'][t] = 'Dividends' in hist.columns
+    if not parts:
+        return out
+
+    def column(name):
+        return np.concatenate([hist[name].to_numpy(dtype=float) if name in hist.columns else np.full(len(hist), np.nan)
+                               for _, hist in parts])
+
+    code = np.concatenate([np.full(len(hist), t) for t, hist in parts])
+    year = np.concatenate([hist.index.year.to_numpy() for _, hist in parts])
+    dates = np.concatenate([hist.index.to_numpy() for _, hist in parts])
+    has_splits = np.concatenate([np.full(len(hist), 'Stock Splits' in hist.columns) for _, hist in parts])
+    close, splits = column('Close'), column('Stock Splits')
+
+    # Bloques contiguos (ticker, año): las barras de cada ticker están ordenadas por fecha
+    starts = np.flatnonzero(np.r_[True, (code[1:] != code[:-1]) | (year[1:] != year[:-1])])
+    ends = np.r_[starts[1:] - 1, len(code) - 1]
+    block_code, block_year = code[starts], year[starts]
+
+    # Cierre de fin de año: último bloque del ticker con año <= año pedido
+    key = block_code.astype(np.int64) * 10000 + block_year
+    grid_t, grid_y = np.meshgrid(np.arange(n_tickers), years_arr, indexing='ij')
+    pos = np.searchsorted(key, grid_t * 10000 + grid_y, side='right') - 1
+    safe_pos = np.clip(pos, 0, None)
+    found = (pos >= 0) & (block_code[safe_pos] == grid_t)
+    out['close'] = np.where(found, close[ends][safe_pos], np.nan)
+
+    in_years = np.isin(block_year, years_arr)
+    t_idx, y_idx = block_code[in_years], np.searchsorted(years_arr, block_year[in_years])
+    out['has_bars'][t_idx, y_idx] = True
+    out['high'][t_idx, y_idx] = np.fmax.reduceat(column('High'), starts)[in_years]
+    out['low'][t_idx, y_idx] = np.fmin.reduceat(column('Low'), starts)[in_years]
+    dividends = column('Dividends')
+    out['dividends'][t_idx, y_idx] = np.add.reduceat(np.where(np.isnan(dividends), 0.0, dividends), starts)[in_years]
+    out['dividends'][~out['has_dividends']] = np.nan
+
+    # Splits (raros): factor como texto, igual que en PriceHistorySummary
+    for i in np.flatnonzero(has_splits & (splits != 0)):
+        out['splits'].setdefault((int(code[i]), int(year[i])), []).append(str(splits[i]))
+
+    # Rendimientos diarios sin cruzar años (ni tickers)
+    previous = np.r_[np.nan, close[:-1]]
+    previous[starts] = np.nan
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = close / previous - 1.0
+    valid = ~np.isnan(returns)
+    out['returns'] = (code[valid], dates[valid], returns[valid])
+    return out
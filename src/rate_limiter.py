@@ -0,0 +1,132 @@
+# src/rate_limiter.py
+
+import threading
+import time
+
+from yfinance.exceptions import YFRateLimitError
+from config import (
+    RATE_LIMIT_REQUESTS_PER_SECOND, RATE_LIMIT_BURST, RATE_LIMIT_INITIAL_CONCURRENCY,
+    RATE_LIMIT_MIN_CONCURRENCY, RATE_LIMIT_MAX_CONCURRENCY, RATE_LIMIT_SLOW_SECONDS,
+    RATE_LIMIT_DECREASE_FACTOR, RATE_LIMIT_COOLDOWN_SECONDS,
+)
+
+
+def is_throttle_error(exc) -> bool:
+    """
+    Indica si una excepción corresponde a una respuesta de throttling de Yahoo: YFRateLimitError
+    o un error HTTP cuya respuesta tiene status_code 429 (el texto del mensaje no cuenta).
+    """
+    if isinstance(exc, YFRateLimitError):
+        return True
+    response = getattr(exc, 'response', None)
+    return getattr(response, 'status_code', None) == 429
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket compartido con un límite de concurrencia AIMD.
+    - Cada petición consume un token; los tokens se reponen a `rate` por segundo hasta `burst`.
+    - El número de peticiones simultáneas crece en +1 por cada ventana de respuestas rápidas
+      y se multiplica por `decrease_factor` ante throttling o respuestas lentas.
+    - Tras un throttling se pausan todas las peticiones durante `cooldown` segundos.
+    """
+
+    def __init__(self, rate, burst, initial_concurrency, min_concurrency, max_concurrency,
+                 slow_seconds, decrease_factor, cooldown):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.slow_seconds = slow_seconds
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+
+        self._cond = threading.Condition()
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._last_decrease = float('-inf')
+        self._limit = float(min(max(initial_concurrency, min_concurrency), max_concurrency))
+        self._in_flight = 0
+        self._counters = {'requests': 0, 'throttled': 0, 'slow': 0, 'decreases': 0, 'wait_seconds': 0.0}
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def acquire(self):
+        """Bloquea hasta que haya un token y un hueco de concurrencia disponibles."""
+        start = time.monotonic()
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self._in_flight >= int(self._limit):
+                    wait = None  # se despierta al liberar un hueco
+                elif self._tokens < 1.0:
+                    wait = (1.0 - self._tokens) / self.rate
+                else:
+                    self._tokens -= 1.0
+                    self._in_flight += 1
+                    self._counters['requests'] += 1
+                    self._counters['wait_seconds'] += now - start
+                    return
+                self._cond.wait(timeout=wait)
+
+    def _decrease(self, now):
+        # Una sola reducción por ventana de cooldown: las peticiones que ya estaban en vuelo
+        # cuando empezó la saturación no vuelven a recortar el límite.
+        if now - self._last_decrease >= self.cooldown:
+            self._limit = max(float(self.min_concurrency), self._limit * self.decrease_factor)
+            self._last_decrease = now
+            self._counters['decreases'] += 1
+
+    def release(self, latency=None, throttled=False):
+        """Libera el hueco y ajusta la concurrencia según el resultado de la petición."""
+        with self._cond:
+            now = time.monotonic()
+            self._in_flight -= 1
+            if throttled:
+                self._counters['throttled'] += 1
+                self._paused_until = max(self._paused_until, now + self.cooldown)
+                self._decrease(now)
+            elif latency is not None and latency > self.slow_seconds:
+                self._counters['slow'] += 1
+                self._decrease(now)
+            else:
+                # Incremento aditivo: ~+1 tras `limit` respuestas correctas
+                self._limit = min(float(self.max_concurrency), self._limit + 1.0 / self._limit)
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        """Instantánea del estado del limitador (para logs y diagnóstico)."""
+        with self._cond:
+            self._refill(time.monotonic())
+            return {
+                'concurrency_limit': int(self._limit),
+                'in_flight': self._in_flight,
+                'tokens': round(self._tokens, 2),
+                'rate_per_second': self.rate,
+                'paused_for': round(max(0.0, self._paused_until - time.monotonic()), 2),
+                **{k: (round(v, 2) if isinstance(v, float) else v) for k, v in self._counters.items()},
+            }
+
+
+_limiter = AdaptiveRateLimiter(
+    rate=RATE_LIMIT_REQUESTS_PER_SECOND,
+    burst=RATE_LIMIT_BURST,
+    initial_concurrency=RATE_LIMIT_INITIAL_CONCURRENCY,
+    min_concurrency=RATE_LIMIT_MIN_CONCURRENCY,
+    max_concurrency=RATE_LIMIT_MAX_CONCURRENCY,
+    slow_seconds=RATE_LIMIT_SLOW_SECONDS,
+    decrease_factor=RATE_LIMIT_DECREASE_FACTOR,
+    cooldown=RATE_LIMIT_COOLDOWN_SECONDS,
+)
+
+
+def get_rate_limiter() -> AdaptiveRateLimiter:
+    """Devuelve el limitador global compartido por todas las llamadas a Yahoo."""
+    return _limiter
+
@@ -0,0 +1,68 @@
+# src/replay.py
+
+import json
+import logging
+import os
+from datetime import datetime
+
+from config import YEARS_TO_EXTRACT
+from src import disk_cache
+
+# Modo de la ejecución: None (red), 'record' (--record DIR) o 'replay' (--replay DIR)
+_mode = None
+_directory = None
+
+
+class ReplayMissError(Exception):
+    """El archivo de --replay no contiene el dataset pedido (nunca se va a la red)."""
+
+
+class ReplayTicker:
+    """Sustituto de yf.Ticker con --replay: solo lleva el símbolo (fetch_datasets no lo usa para descargar)."""
+
+    def __init__(self, symbol: str):
+        self.ticker = symbol.upper()
+
+
+def set_record(directory: str):
+    """Activa --record: cada dataset obtenido se archiva en `directory` por ticker."""
+    global _mode, _directory
+    _mode, _directory = 'record', directory
+    os.makedirs(directory, exist_ok=True)
+    manifest = {'recorded_at': datetime.now().isoformat(timespec='seconds'), 'years': list(YEARS_TO_EXTRACT)}
+    with open(os.path.join(directory, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1)
+
+
+def set_replay(directory: str):
+    """Activa --replay: los datasets se sirven desde `directory` sin acceder a la red."""
+    global _mode, _directory
+    if not os.path.isdir(directory):
+        raise FileNotFoundError(f"No existe el directorio de grabación: {directory}")
+    _mode, _directory = 'replay', directory
+
+
+def is_recording() -> bool:
+    return _mode == 'record'
+
+
+def is_replaying() -> bool:
+    return _mode == 'replay'
+
+
+def record(symbol: str, dataset: str, value):
+    """Archiva un dataset obtenido (solo con --record)."""
+    if _mode != 'record':
+        return
+    try:
+        disk_cache.write_entry(_directory, symbol, dataset, value)
+    except Exception as e:
+        logging.warning(f"No se pudo grabar {symbol}/{dataset}: {e}")
+
+
+def load(symbol: str, dataset: str):
+    """Devuelve el dataset grabado. Lanza ReplayMissError si no está en el archivo."""
+    hit, value = disk_cache.read_entry(_directory, symbol, dataset)
+    if not hit:
+        raise ReplayMissError(f"{symbol.upper()}/{dataset} no está en la grabación {_directory}.")
+    return value
@@ -0,0 +1,131 @@
+# src/result.py
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from config import YEARS_TO_EXTRACT
+
+# Periodos de cada métrica: un año por columna de YEARS_TO_EXTRACT más el valor 'actual'
+PERIODS = YEARS_TO_EXTRACT + ['actual']
+# Filas del CSV que no son un número por periodo: se guardan en tablas propias
+RANGE_ROW = '52WeekRange'
+ACTIONS_ROW = 'dividend_and_split'
+TEXT_ROWS = (RANGE_ROW, ACTIONS_ROW)
+
+# Tabla de eventos corporativos: una fila por evento (dividendos del año o factor de split)
+ACTION_KINDS = pd.CategoricalDtype(['dividend', 'split'])
+ACTION_DTYPES = {'period': object, 'kind': ACTION_KINDS, 'amount': 'float64', 'factor': 'string'}
+
+
+def to_float(value) -> float:
+    """float(value), o NaN si falta o no es numérico."""
+    try:
+        return np.nan if value is None else float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def range_table(low, high) -> pd.DataFrame:
+    """Rangos mínimo-máximo por periodo: DataFrame float64 periodo × ['low', 'high']."""
+    return pd.DataFrame({'low': low, 'high': high}, index=PERIODS, dtype='float64')
+
+
+def actions_table(events) -> pd.DataFrame:
+    """Tabla tipada de eventos a partir de tuplas (period, kind, amount, factor)."""
+    return pd.DataFrame(list(events), columns=list(ACTION_DTYPES)).astype(ACTION_DTYPES)
+
+
+def _cell(value):
+    return None if pd.isna(value) else value
+
+
+class FundamentalsResult:
+    """
+    Resultado tipado de un ticker, con los metadatos una sola vez (no por fila):
+      - ticker, as_of (datetime del cálculo) y price (cotización actual, float o None).
+      - values: matriz float64 métrica × periodo (PERIODS) con las filas numéricas (NaN = sin dato).
+      - ranges: float64 periodo × ['low', 'high'] de 52WeekRange (None si no se pidió).
+      - actions: eventos corporativos (ver ACTION_DTYPES): dividendos de cada año y factores
+        de split; en 'actual', el último dividendo y el último split de info (None si no se pidió).
+    rows conserva las filas pedidas en su orden (incluidas las de TEXT_ROWS).
+    """
+
+    # Un lote grande mantiene miles de resultados en memoria: sin __dict__ por instancia
+    __slots__ = ('ticker', 'as_of', 'price', 'rows', 'values', 'ranges', 'actions')
+
+    def __init__(self, ticker: str, rows, values: pd.DataFrame, ranges: pd.DataFrame = None,
+                 actions: pd.DataFrame = None, as_of: datetime = None, price=None):
+        self.ticker = ticker
+        self.as_of = datetime.now() if as_of is None else as_of
+        self.price = None if price is None or np.isnan(to_float(price)) else float(price)
+        self.rows = list(rows)
+        self.values = values
+        self.ranges = ranges
+        self.actions = actions
+
+    @classmethod
+    def from_rows(cls, ticker: str, rows, computed: dict, price=None) -> 'FundamentalsResult':
+        """Construye el resultado a partir de {fila: valor} de las fórmulas del registro (src/metrics.py)."""
+        rows = list(rows)
+        numeric = [row for row in rows if row not in TEXT_ROWS]
+        values = pd.DataFrame([np.asarray(computed[row], dtype='float64') for row in numeric],
+                              index=numeric, columns=PERIODS, dtype='float64')
+        return cls(ticker, rows, values, ranges=computed.get(RANGE_ROW), actions=computed.get(ACTIONS_ROW), price=price)
+
+    @property
+    def empty(self) -> bool:
+        return not self.rows
+
+    def row(self, metric) -> np.ndarray:
+        """Valores float64 de una métrica por periodo (todo NaN si no se calculó)."""
+        if metric in self.values.index:
+            return self.values.loc[metric].to_numpy(dtype='float64')
+        return np.full(len(PERIODS), np.nan)
+
+    def range_bounds(self):
+        """(low, high) por periodo como arrays float64 (NaN si no hay rango)."""
+        if self.ranges is None:
+            return np.full(len(PERIODS), np.nan), np.full(len(PERIODS), np.nan)
+        return self.ranges['low'].to_numpy(), self.ranges['high'].to_numpy()
+
+    def dividends(self, period):
+        """Dividendos del periodo (None si no hubo)."""
+        if self.actions is None:
+            return None
+        found = self.actions[(self.actions['period'] == period) & (self.actions['kind'] == 'dividend')]
+        return None if found.empty else _cell(found['amount'].iloc[0])
+
+    def splits(self, period) -> list:
+        """Factores de split del periodo como texto (lista vacía si no hubo)."""
+        if self.actions is None:
+            return []
+        found = self.actions[(self.actions['period'] == period) & (self.actions['kind'] == 'split')]
+        return [str(factor) for factor in found['factor']]
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Vista de texto (object, filas × PERIODS): 52WeekRange como 'low-high' y
+        dividend_and_split como diccionarios. Solo para mostrar (logs); los writers leen
+        los campos tipados.
+        """
+        frame = pd.DataFrame(index=self.rows, columns=PERIODS, dtype=object)
+        for row in self.rows:
+            if row == RANGE_ROW:
+                low, high = self.range_bounds()
+                frame.loc[row] = [None if np.isnan(lo) or np.isnan(hi) else f"{lo}-{hi}" for lo, hi in zip(low, high)]
+            elif row == ACTIONS_ROW:
+                cells = []
+                for period in PERIODS[:-1]:
+                    div, splits = self.dividends(period), self.splits(period)
+                    cells.append({'dividends': div, 'splits': splits or None} if div is not None or splits else None)
+                last_split = self.splits('actual')
+                cells.append({'lastDividend': self.dividends('actual'), 'lastSplit': last_split[0] if last_split else None})
+                frame.loc[row] = cells
+            else:
+                frame.loc[row] = [_cell(value) for value in self.row(row)]
+        return frame
+
+    def header(self) -> str:
+        """Línea de cabecera para logs: ticker | fecha | cotización."""
+        return f"{self.ticker} | {self.as_of:%Y-%m-%d} | {'' if self.price is None else self.price}"
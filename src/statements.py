@@ -0,0 +1,175 @@
+# src/statements.py
+
+import numpy as np
+import pandas as pd
+
+# Métrica canónica -> nombres de fila candidatos en los estados de yfinance, en orden de
+# preferencia (las etiquetas cambian entre tickers y versiones de yfinance)
+INCOME_LABELS = {
+    'total_revenue': ['Total Revenue', 'totalRevenue', 'TotalRevenue'],
+    'cost_of_revenue': ['Cost Of Revenue', 'Cost of Revenue', 'costOfRevenue', 'CostOfRevenue'],
+    'operating_expense': ['Operating Expense', 'Operating Expenses', 'OperatingIncome', 'Operating Income', 'operatingExpense', 'operatingExpenses'],
+    'net_income': ['Net Income', 'NetIncome', 'netIncome', 'Net Income Applicable To Common Shares', 'NetIncomeLoss'],
+    # ROE y margen usan solo las variantes directas de 'Net Income'
+    'net_income_direct': ['Net Income', 'NetIncome', 'netIncome'],
+    'ebitda': ['EBITDA', 'EBIDTA', 'ebitda', 'ebitdta'],
+    'ordinary_shares': ['Basic Average Shares', 'Basic Average Shares (Shares)', 'BasicAverageShares', 'Basic EPS Shares', 'Basic Shares', 'Weighted Average Shares', 'WeightedAverageShares'],
+}
+BALANCE_LABELS = {
+    'cash': ['Cash And Cash Equivalents', 'Cash And Cash Equivalents (Total)', 'Cash', 'cash'],
+    'total_assets': ['Total Assets', 'totalAssets', 'TotalAssets'],
+    'total_liabilities': ['Total Liab', 'Total Liabilities', 'totalLiab', 'totalLiabilities'],
+    'total_current_assets': ['Total Current Assets', 'TotalCurrentAssets', 'totalCurrentAssets'],
+    'total_current_liabilities': ['Total Current Liabilities', 'TotalCurrentLiabilities', 'totalCurrentLiabilities'],
+    'intangible_assets': ['Intangible Assets', 'intangibleAssets', 'Goodwill And Intangible Assets'],
+    'goodwill': ['Goodwill', 'goodWill'],
+    'long_term_debt': ['Long Term Debt', 'Long-term Debt', 'longTermDebt'],
+    'short_term_debt': ['Short Long Term Debt', 'Short Term Debt', 'Short-term Debt', 'shortTermDebt'],
+    'working_capital': ['Working Capital'],
+    'net_debt': ['Net Debt'],
+    'total_equity': ['Total Stockholder Equity', 'TotalStockholderEquity', 'Total Stockholders Equity', 'Total Equity', 'TotalAssets'],
+}
+
+
+def column_year(col):
+    """Return the year for a column label which may be a Timestamp or a string.
+    Returns None if it cannot be determined.
+    """
+    try:
+        return col.year
+    except Exception:
+        try:
+            return pd.to_datetime(col).year
+        except Exception:
+            return None
+
+
+def safe_get_value(df, row_name, date):
+    """Accede a un valor del DataFrame de forma segura, devolviendo None si la clave o la fila falta."""
+    try:
+        value = df.loc[row_name, date]
+        return value if pd.notna(value) else None
+    except Exception:
+        return None
+
+
+def get_value_candidates(df, candidates, date):
+    """Intenta múltiples nombres de fila en orden y devuelve el primero válido."""
+    for name in candidates:
+        val = safe_get_value(df, name, date)
+        if val is not None:
+            return val
+    return None
+
+
+def normalize_label(label) -> str:
+    """Forma normalizada de una etiqueta para compararla sin mayúsculas, espacios ni '_'."""
+    return str(label).strip().lower().replace(' ', '').replace('_', '')
+
+
+class StatementIndex:
+    """
+    Índice de etiquetas de un estado financiero (filas = conceptos, columnas = fechas)
+    resuelto una sola vez: cada métrica canónica de `labels` (ver INCOME_LABELS /
+    BALANCE_LABELS) queda asociada a su posición de fila, de modo que cada consulta
+    posterior es O(1). La resolución es la de la búsqueda original: primero coincidencia
+    normalizada exacta por orden de candidatos y, si no hay, subcadena sin mayúsculas.
+    """
+
+    def __init__(self, df, labels=None):
+        self.df = df if isinstance(df, pd.DataFrame) else pd.DataFrame()
+        self._row_labels = list(self.df.index)
+        # Con etiquetas repetidas se conserva la última, como el mapa original
+        self._normalized = {normalize_label(label): pos for pos, label in enumerate(self._row_labels)}
+        self._lowered = None
+        self._duplicated_rows = set(self.df.index[self.df.index.duplicated(keep=False)])
+        self._col_pos = {}
+        for pos, col in enumerate(self.df.columns):
+            # Columnas repetidas: df.loc devolvería varias celdas (sin valor único)
+            self._col_pos[col] = None if col in self._col_pos else pos
+        self._values = self.df.to_numpy()
+        self._resolved = {}
+        self._positions = {name: self.resolve(candidates) for name, candidates in (labels or {}).items()}
+
+    @property
+    def columns(self):
+        return self.df.columns
+
+    def resolve(self, candidates):
+        """Posición de la fila que corresponde a los candidatos (o None). Se memoriza por lista."""
+        key = tuple(candidates)
+        if key in self._resolved:
+            return self._resolved[key]
+        pos = None
+        for cand in candidates:
+            pos = self._normalized.get(normalize_label(cand))
+            if pos is not None:
+                break
+        else:
+            # Fallback: subcadena sin mayúsculas, en el orden del índice
+            if self._lowered is None:
+                self._lowered = [str(label).strip().lower() for label in self._row_labels]
+            for cand in candidates:
+                low = str(cand).strip().lower()
+                pos = next((i for i, label in enumerate(self._lowered) if low in label), None)
+                if pos is not None:
+                    break
+        self._resolved[key] = pos
+        return pos
+
+    def label(self, metric):
+        """Etiqueta original de la fila de una métrica canónica (o None si el estado no la tiene)."""
+        pos = self._positions.get(metric)
+        return None if pos is None else self._row_labels[pos]
+
+    def _cell(self, pos, date):
+        if pos is None or self._row_labels[pos] in self._duplicated_rows:
+            return None
+        col = self._col_pos.get(date)
+        if col is None:
+            return None
+        value = self._values[pos, col]
+        return value if pd.notna(value) else None
+
+    def get(self, metric, date):
+        """Valor de una métrica canónica en la columna `date`, o None si falta o es NaN."""
+        return self._cell(self._positions.get(metric), date)
+
+    def get_candidates(self, candidates, date):
+        """Como get() para una lista de candidatos arbitraria (se resuelve una vez y se memoriza)."""
+        return self._cell(self.resolve(candidates), date)
+
+    def to_matrix(self, years):
+        """
+        Extrae en una sola pasada por columna todas las métricas canónicas como una matriz
+        float64 (filas = métricas, columnas = años de `years`; NaN = sin dato). Si varias
+        columnas caen en el mismo año gana la última. Devuelve también una Series booleana
+        con los años que tienen columna en el estado.
+        """
+        years = list(years)
+        metrics = list(self._positions)
+        slot_of_year = {year: i for i, year in enumerate(years)}
+        matrix = np.full((len(metrics), len(years)), np.nan)
+        present = np.zeros(len(years), dtype=bool)
+        positions = [self._positions[m] for m in metrics]
+        usable = np.array([pos is not None and self._row_labels[pos] not in self._duplicated_rows for pos in positions], dtype=bool)
+        rows = np.array([pos if ok else 0 for pos, ok in zip(positions, usable)], dtype=int)
+        for col_pos, col in enumerate(self.df.columns):
+            slot = slot_of_year.get(column_year(col))
+            if slot is None:
+                continue
+            present[slot] = True
+            if self._col_pos.get(col) is None or not len(rows):
+                matrix[:, slot] = np.nan
+                continue
+            values = pd.to_numeric(self._values[rows, col_pos], errors='coerce')
+            matrix[:, slot] = np.where(usable, values, np.nan)
+        return (pd.DataFrame(matrix, index=metrics, columns=years),
+                pd.Series(present, index=years))
+
+
+def as_statement_index(statement, labels=None) -> StatementIndex:
+    """Devuelve `statement` si ya es un StatementIndex o lo construye a partir del DataFrame."""
+    if isinstance(statement, StatementIndex):
+        return statement
+    return StatementIndex(statement, labels)
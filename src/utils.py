@@ -2,6 +2,27 @@
 
 import logging
 import sys
+import threading
+from contextlib import contextmanager
+
+# Buffer de registros por hilo: cuando un hilo está capturando, sus logs se guardan
+# en vez de emitirse, para poder reproducirlos después en un orden determinista.
+_log_capture = threading.local()
+
+
+class _ThreadCaptureFilter(logging.Filter):
+    """Desvía al buffer del hilo actual los registros emitidos mientras captura."""
+
+    def filter(self, record):
+        records = getattr(_log_capture, 'records', None)
+        if records is None:
+            return True
+        records.append(record)
+        return False
+
+
+_capture_filter = _ThreadCaptureFilter()
+
 
 def setup_logging():
     """Configura un logger básico que imprime a la consola."""
@@ -10,4 +31,111 @@ def setup_logging():
         format="[%(asctime)s] - %(levelname)s - %(message)s",
         datefmt="%Y-%m-%d %H:%M:%S",
         handlers=[logging.StreamHandler(sys.stdout)]
-    )
\ No newline at end of file
+    )
+    root = logging.getLogger()
+    if _capture_filter not in root.filters:
+        root.addFilter(_capture_filter)
+
+
+@contextmanager
+def capture_logs(records=None):
+    """
+    Captura los logs del hilo actual en una lista en lugar de emitirlos.
+    Si se pasa `records`, se añaden a esa lista (p. ej. varias etapas del mismo ticker).
+    """
+    records = [] if records is None else records
+    previous = getattr(_log_capture, 'records', None)
+    _log_capture.records = records
+    try:
+        yield records
+    finally:
+        _log_capture.records = previous
+
+
+def bind_log_capture(fn):
+    """
+    Envuelve fn para que, al ejecutarse en otro hilo (p. ej. un pool de descargas),
+    sus logs vayan al mismo buffer que el hilo que la creó.
+    """
+    records = getattr(_log_capture, 'records', None)
+
+    def _bound(*args, **kwargs):
+        previous = getattr(_log_capture, 'records', None)
+        _log_capture.records = records
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _log_capture.records = previous
+    return _bound
+
+
+def replay_logs(records):
+    """Emite (en orden) los registros capturados previamente con capture_logs()."""
+    root = logging.getLogger()
+    for record in records:
+        root.handle(record)
+
+
+# Marca de posición descartada en TickerOrderBuffer
+_SKIPPED = object()
+
+
+class TickerOrderBuffer:
+    """
+    Reordena lo que llega de varios hilos (en orden de finalización) al orden de `tickers`,
+    p. ej. el del archivo de tickers. put() guarda un elemento en la posición de su ticker
+    y devuelve los que ya se pueden emitir: los siguientes en orden cuyas posiciones
+    anteriores ya llegaron o se descartaron con skip(). Un ticker repetido ocupa sus
+    posiciones por turno y uno que no está en `tickers` va al final.
+    max_pending limita cuántos elementos esperan a la vez: si se supera, se deja de esperar
+    a los tickers que faltan delante y, si llegan después, se emiten en cuanto llegan. No
+    usa lock: quien lo comparta entre hilos debe protegerlo.
+    """
+
+    def __init__(self, tickers, max_pending=None):
+        self._positions = {}
+        for position, ticker in enumerate(tickers):
+            self._positions.setdefault(ticker, []).append(position)
+        self._end = len(tickers)
+        self._max_pending = max_pending
+        self._items = {}
+        self._next = 0
+
+    def put(self, ticker, item) -> list:
+        positions = self._positions.get(ticker)
+        if positions:
+            position = positions.pop(0)
+        else:
+            position = self._end
+            self._end += 1
+        if position < self._next:
+            # Ya no se le esperaba (ver max_pending): va a continuación de lo emitido
+            return [item]
+        self._items[position] = item
+        return self._ready()
+
+    def skip(self, ticker) -> list:
+        """El ticker no tendrá elemento: deja de esperarlo. Devuelve los que quedan listos."""
+        positions = self._positions.get(ticker)
+        if positions:
+            position = positions.pop(0)
+            if position >= self._next:
+                self._items[position] = _SKIPPED
+        return self._ready()
+
+    def drain(self) -> list:
+        """Todos los elementos pendientes, en orden (sin esperar a los que faltan)."""
+        items = [self._items[p] for p in sorted(self._items)]
+        self._items.clear()
+        self._next = self._end
+        return [item for item in items if item is not _SKIPPED]
+
+    def _ready(self) -> list:
+        ready = []
+        while self._next in self._items or (self._max_pending is not None and len(self._items) > self._max_pending):
+            # Una posición que falta solo se salta si hay demasiados elementos esperando
+            item = self._items.pop(self._next, _SKIPPED)
+            self._next += 1
+            if item is not _SKIPPED:
+                ready.append(item)
+        return ready
@@ -0,0 +1,214 @@
+# src/yahoo_client.py
+
+import json
+import logging
+import random
+import threading
+import time
+from collections import Counter
+
+import yfinance as yf
+from curl_cffi import CurlOpt, requests as curl_requests
+from yfinance.exceptions import (
+    YFInvalidPeriodError, YFPricesMissingError, YFTickerMissingError, YFTzMissingError,
+)
+from config import (
+    RETRY_MAX_ATTEMPTS, RETRY_BASE_DELAY_SECONDS, RETRY_MAX_DELAY_SECONDS,
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD, CIRCUIT_BREAKER_RESET_SECONDS,
+    HTTP_POOL_SIZE, HTTP_TIMEOUT_SECONDS, HTTP_IMPERSONATE, DATA_PROVIDER,
+)
+from src import fake_provider
+from src.rate_limiter import get_rate_limiter, is_throttle_error
+
+# Errores que dependen del ticker o de la petición y no se arreglan reintentando
+_PERMANENT_ERRORS = (
+    YFTickerMissingError, YFTzMissingError, YFPricesMissingError, YFInvalidPeriodError,
+    KeyError, TypeError, AttributeError,
+)
+
+
+_session_lock = threading.Lock()
+_session = None
+_data_provider = DATA_PROVIDER
+
+
+def create_http_session(pool_size: int = HTTP_POOL_SIZE):
+    """Crea una sesión curl_cffi con keep-alive y una cache de `pool_size` conexiones."""
+    return curl_requests.Session(
+        impersonate=HTTP_IMPERSONATE,
+        timeout=HTTP_TIMEOUT_SECONDS,
+        curl_options={CurlOpt.MAXCONNECTS: pool_size, CurlOpt.TCP_KEEPALIVE: 1},
+    )
+
+
+def get_http_session():
+    """
+    Devuelve la sesión HTTP del proceso (se crea en la primera llamada). Compartirla
+    entre todos los yf.Ticker evita repetir el handshake TLS y la obtención de
+    cookie/crumb de Yahoo en cada ticker.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = create_http_session()
+        return _session
+
+
+def set_data_provider(name: str):
+    """Cambia el origen de los datos de la ejecución ("yahoo" o "fake", ver DATA_PROVIDER)."""
+    global _data_provider
+    if name not in ('yahoo', 'fake'):
+        raise ValueError(f"Proveedor de datos desconocido: {name}")
+    _data_provider = name
+
+
+def new_ticker(symbol: str):
+    """Crea un yf.Ticker que usa la sesión HTTP compartida (o el del proveedor simulado)."""
+    if _data_provider == 'fake':
+        return fake_provider.FakeTicker(symbol)
+    return yf.Ticker(symbol, session=get_http_session())
+
+
+def download_history(tickers, **kwargs):
+    """yf.download con la sesión HTTP compartida (o el del proveedor simulado)."""
+    if _data_provider == 'fake':
+        return fake_provider.download(tickers, **kwargs)
+    return yf.download(tickers, session=get_http_session(), **kwargs)
+
+
+class CircuitOpenError(Exception):
+    """El circuito del endpoint está abierto: la llamada se rechaza sin ir a la red."""
+
+
+def is_retryable_error(exc) -> bool:
+    """Indica si un error de yfinance es transitorio (red, throttling, respuesta vacía...)."""
+    if is_throttle_error(exc) or isinstance(exc, json.JSONDecodeError):
+        return True
+    return not isinstance(exc, (_PERMANENT_ERRORS, CircuitOpenError))
+
+
+def backoff_delay(attempt: int) -> float:
+    """Backoff exponencial con tope y 'full jitter' para el reintento número `attempt` (0, 1, ...)."""
+    cap = min(RETRY_MAX_DELAY_SECONDS, RETRY_BASE_DELAY_SECONDS * (2 ** attempt))
+    return random.uniform(0, cap)
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker de un endpoint: tras `failure_threshold` fallos transitorios seguidos
+    se abre y rechaza llamadas durante `reset_seconds`; después deja pasar una llamada
+    de prueba (semiabierto) que lo cierra si tiene éxito o lo vuelve a abrir si falla.
+    """
+
+    def __init__(self, endpoint, failure_threshold, reset_seconds):
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if time.monotonic() - self._opened_at >= self.reset_seconds:
+                return 'half-open'
+            return 'open'
+
+    def before_call(self):
+        """Lanza CircuitOpenError si el endpoint no admite llamadas ahora mismo."""
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at < self.reset_seconds or self._probe_in_flight:
+                raise CircuitOpenError(f"Circuito abierto para el endpoint '{self.endpoint}'")
+            self._probe_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self) -> bool:
+        """Registra un fallo transitorio. Devuelve True si el circuito se acaba de abrir."""
+        with self._lock:
+            self._failures += 1
+            was_probe = self._probe_in_flight
+            self._probe_in_flight = False
+            if was_probe or (self._opened_at is None and self._failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                return True
+            return False
+
+
+_breakers_lock = threading.Lock()
+_breakers = {}
+_stats_lock = threading.Lock()
+_stats = {'calls': Counter(), 'retries': Counter(), 'failures': Counter(), 'breaker_trips': Counter(), 'rejected': Counter()}
+
+
+def get_circuit_breaker(endpoint: str) -> CircuitBreaker:
+    """Devuelve (creándolo si hace falta) el circuit breaker de un endpoint."""
+    with _breakers_lock:
+        if endpoint not in _breakers:
+            _breakers[endpoint] = CircuitBreaker(endpoint, CIRCUIT_BREAKER_FAILURE_THRESHOLD, CIRCUIT_BREAKER_RESET_SECONDS)
+        return _breakers[endpoint]
+
+
+def _count(kind, endpoint):
+    with _stats_lock:
+        _stats[kind][endpoint] += 1
+
+
+def get_call_stats() -> dict:
+    """Contadores de la ejecución por endpoint: llamadas, reintentos, fallos, aperturas y rechazos."""
+    with _stats_lock:
+        out = {kind: dict(counter) for kind, counter in _stats.items()}
+    out['breaker_state'] = {name: b.state for name, b in list(_breakers.items())}
+    return out
+
+
+def call_yahoo(endpoint: str, fn, *args, **kwargs):
+    """
+    Ejecuta una llamada a yfinance protegida por el limitador global, reintentos con
+    backoff exponencial y jitter (RETRY_MAX_ATTEMPTS) y el circuit breaker del endpoint.
+    Los errores permanentes (ticker inexistente, etc.) se propagan sin reintentar.
+    """
+    breaker = get_circuit_breaker(endpoint)
+    limiter = get_rate_limiter()
+    for attempt in range(RETRY_MAX_ATTEMPTS):
+        try:
+            breaker.before_call()
+        except CircuitOpenError:
+            _count('rejected', endpoint)
+            raise
+        limiter.acquire()
+        _count('calls', endpoint)
+        start = time.monotonic()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            throttled = is_throttle_error(e)
+            limiter.release(latency=time.monotonic() - start, throttled=throttled)
+            if not is_retryable_error(e):
+                # Fallo propio del ticker: el endpoint funciona
+                breaker.record_success()
+                raise
+            if breaker.record_failure():
+                _count('breaker_trips', endpoint)
+                logging.warning(f"Circuito abierto para '{endpoint}' tras fallos repetidos; se rechazarán llamadas durante {CIRCUIT_BREAKER_RESET_SECONDS:.0f}s.")
+            if attempt == RETRY_MAX_ATTEMPTS - 1:
+                _count('failures', endpoint)
+                raise
+            _count('retries', endpoint)
+            delay = backoff_delay(attempt)
+            logging.warning(f"Fallo transitorio en '{endpoint}' (intento {attempt + 1}/{RETRY_MAX_ATTEMPTS}): {e}. Reintentando en {delay:.1f}s...")
+            time.sleep(delay)
+            continue
+        limiter.release(latency=time.monotonic() - start)
+        breaker.record_success()
+        return result